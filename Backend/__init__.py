@@ -7,9 +7,23 @@ from flask_mail import Mail
 from flask_login import LoginManager
 from dotenv import load_dotenv
 import os
+import time
+import click
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import timedelta
 
-from .anime_fetcher import fetch_and_store_anime
+from .anime_fetcher import fetch_and_store_anime, sync_anime, backfill_genre_links
+from .anime_import import import_anime_dump
+from .schema import upgrade_schema
+from .fulltext import INDEXES as SEARCH_INDEXES, rebuild_search_index
+from .recommendations import build_recommendations
+from .rating_stats import recompute_rating_stats
+from .reactions import backfill_reaction_counts
+from .tags import recount_tags, tag_cache
+from .hot import refresh_hot_scores, start_hot_refresher
+from .notification_queue import notification_queue, recount_unread_notifications
+from .realtime import event_hub
+from .retention import compact_messages, compact_notifications, database_free_bytes
 from Backend.models import db, User
 from Backend.extensions import db, bcrypt
 
@@ -85,6 +99,7 @@ def create_app():
     from .routes.report import report_bp
     from .routes.friendship import friendship_bp
     from .routes.search import search_bp
+    from .routes.stream import stream_bp
     
     from .routes.test_mail import mail_debug_bp #############
     app.register_blueprint(mail_debug_bp)
@@ -104,15 +119,147 @@ def create_app():
     app.register_blueprint(report_bp)
     app.register_blueprint(friendship_bp)
     app.register_blueprint(search_bp)
+    app.register_blueprint(stream_bp)
+
+    with app.app_context():
+        try:
+            print(f"🏷️ Tag cache warmed with {tag_cache.warm()} tags")
+        except SQLAlchemyError as e:
+            # e.g. before `flask upgrade-db` has created the tables; lookups fall back to the DB
+            db.session.rollback()
+            print(f"⚠️ Tag cache not warmed: {e.__class__.__name__}")
+
+    if app.config.get('HOT_REFRESH_SECONDS'):
+        # Started by the first request like the flusher below, so CLI commands
+        # never run a refresher alongside their own work
+        @app.before_request
+        def start_hot_score_refresher():
+            start_hot_refresher(app, app.config['HOT_REFRESH_SECONDS'])
+
+    if app.config.get('NOTIFICATION_FLUSH_SECONDS'):
+        # Started by the first request, so only serving processes buffer; CLI
+        # commands never start it and write each notification straight through
+        @app.before_request
+        def start_notification_flusher():
+            notification_queue.start(app, app.config['NOTIFICATION_FLUSH_SECONDS'])
+
+    if app.config.get('SSE_POLL_SECONDS'):
+        # Also started by the first request: only serving processes have streams to feed
+        @app.before_request
+        def start_event_poller():
+            event_hub.start_poller(app, app.config['SSE_POLL_SECONDS'])
 
     print("\n🔧 REGISTERED ROUTES:")
     for rule in app.url_map.iter_rules():
         print(f"📍 {rule.endpoint}: {rule}")
 
     @app.cli.command("fetch-anime")
-    def fetch_anime_command():
+    @click.option("--pages", default=100, show_default=True, help="Number of Jikan pages to fetch.")
+    @click.option("--concurrency", type=int, help="Requests in flight (default: JIKAN_CONCURRENCY).")
+    @click.option("--rate", type=float, help="Requests per second (default: JIKAN_RATE_LIMIT).")
+    def fetch_anime_command(pages, concurrency, rate):
+        with app.app_context():
+            fetch_and_store_anime(pages=pages, concurrency=concurrency, rate=rate)
+
+    @app.cli.command("sync-anime")
+    @click.option("--max-pages", type=int, help="Stop after this many pages (resume on the next run).")
+    @click.option("--restart", is_flag=True, help="Ignore the checkpoint and start from page 1.")
+    @click.option("--concurrency", type=int, help="Requests in flight (default: JIKAN_CONCURRENCY).")
+    @click.option("--rate", type=float, help="Requests per second (default: JIKAN_RATE_LIMIT).")
+    def sync_anime_command(max_pages, restart, concurrency, rate):
+        with app.app_context():
+            sync_anime(max_pages=max_pages, restart=restart, concurrency=concurrency, rate=rate)
+
+    @app.cli.command("import-anime")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--batch-size", default=2000, show_default=True, help="Rows per upsert/commit.")
+    def import_anime_command(path, batch_size):
+        with app.app_context():
+            import_anime_dump(path, batch_size=batch_size)
+
+    @app.cli.command("backfill-genres")
+    def backfill_genres_command():
+        with app.app_context():
+            backfill_genre_links()
+
+    @app.cli.command("rebuild-search")
+    def rebuild_search_command():
+        with app.app_context():
+            for search_index in SEARCH_INDEXES.values():
+                rebuild_search_index(search_index)
+                print(f"✅ Rebuilt '{search_index.name}' search index.")
+
+    @app.cli.command("build-recommendations")
+    @click.option("--k", default=20, show_default=True, help="Neighbors kept per anime.")
+    @click.option("--method", type=click.Choice(["adjusted", "cosine"]), default="adjusted", show_default=True)
+    def build_recommendations_command(k, method):
+        with app.app_context():
+            build_recommendations(k=k, method=method)
+
+    @app.cli.command("recompute-ratings")
+    @click.option("--anime-id", "anime_ids", type=int, multiple=True, help="Limit to these anime (repeatable).")
+    def recompute_ratings_command(anime_ids):
+        with app.app_context():
+            written, drifted = recompute_rating_stats(list(anime_ids) or None)
+            print(f"✅ Recomputed rating stats for {written} anime ({drifted} rows were out of date).")
+
+    @app.cli.command("backfill-reaction-counts")
+    def backfill_reaction_counts_command():
+        with app.app_context():
+            updated = backfill_reaction_counts()
+            print(f"✅ Backfilled like/dislike counts on {updated} posts and reviews.")
+
+    @app.cli.command("recount-tags")
+    def recount_tags_command():
+        with app.app_context():
+            fixed = recount_tags()
+            print(f"✅ Recounted tag post counts ({fixed} tags corrected).")
+
+    @app.cli.command("refresh-hot-scores")
+    @click.option("--all", "full", is_flag=True, help="Recompute every post, not just recently active ones.")
+    def refresh_hot_scores_command(full):
+        with app.app_context():
+            started = time.monotonic()
+            updated = refresh_hot_scores(full=full)
+            print(f"✅ Refreshed hot scores for {updated} posts in {time.monotonic() - started:.1f}s.")
+
+    @app.cli.command("recount-unread")
+    def recount_unread_command():
+        with app.app_context():
+            fixed = recount_unread_notifications()
+            print(f"✅ Recounted unread notifications ({fixed} users corrected).")
+
+    @app.cli.command("compact")
+    @click.option("--notification-days", type=int, help="Archive read notifications older than this "
+                                                           "(default: NOTIFICATION_RETENTION_DAYS).")
+    @click.option("--message-days", type=int, help="Archive messages older than this (default: MESSAGE_RETENTION_DAYS).")
+    @click.option("--vacuum", is_flag=True, help="VACUUM afterwards to shrink the file (SQLite; locks the database).")
+    def compact_command(notification_days, message_days, vacuum):
+        with app.app_context():
+            free_before = database_free_bytes()
+            started = time.monotonic()
+            notifications = compact_notifications(notification_days or app.config['NOTIFICATION_RETENTION_DAYS'])
+            print(f"🗜️ Notifications: {notifications}")
+            messages = compact_messages(message_days or app.config['MESSAGE_RETENTION_DAYS'])
+            print(f"🗜️ Messages: {messages}")
+            freed = database_free_bytes()
+            if freed is not None:
+                print(f"📦 {(freed - free_before) / 1024:.0f} KB of database pages freed")
+                if vacuum:
+                    size_before = os.path.getsize(db.engine.url.database)
+                    with db.engine.connect() as conn:
+                        conn.exec_driver_sql("VACUUM")
+                    print(f"📦 VACUUM shrank the file by {(size_before - os.path.getsize(db.engine.url.database)) / 1024:.0f} KB")
+            print(f"✅ Compaction moved {notifications.rows + messages.rows} rows in {time.monotonic() - started:.1f}s.")
+
+    @app.cli.command("upgrade-db")
+    def upgrade_db_command():
         with app.app_context():
-            fetch_and_store_anime(pages=100, delay=1)
+            added = upgrade_schema()
+            print(f"✅ Schema up to date ({len(added)} columns added: {', '.join(added) or 'none'}).")
+            # Reviews written before anime_rating_stats existed have no row there yet
+            written, drifted = recompute_rating_stats()
+            print(f"✅ Rating stats rebuilt for {written} anime ({drifted} rows were out of date).")
 
     @app.shell_context_processor
     def make_shell_context():
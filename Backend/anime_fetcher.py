@@ -1,51 +1,448 @@
-import requests
+import asyncio
+import hashlib
+import itertools
+import json
+import random
 import time
-from Backend.models import db, Anime
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import datetime
 
-def fetch_and_store_anime(pages=1, delay=1):
-    for page in range(1, pages + 1):
-        print(f"Fetching page {page}...")
+import aiohttp
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from Backend.db_utils import dialect_insert
+from Backend.models import db, Anime, Genre, Studio, SyncCheckpoint, anime_genre, anime_studio
+from Backend.signals import anime_catalog_changed
+
+# Jikan answers 429 when throttled and the occasional 5xx under load; both are worth retrying.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+ANIME_FIELDS = (
+    "mal_id", "title", "image_url", "synopsis", "score", "episodes", "status", "year",
+    "genres", "studios", "duration", "type", "popularity", "favorites", "members", "source",
+)
+
+
+class FetchError(Exception):
+    """Raised when a page cannot be fetched, after retries where they apply."""
+
+
+def anime_fields(item):
+    """Map one Jikan anime record onto Anime column values."""
+    return dict(
+        mal_id=item["mal_id"],
+        title=item["title"],
+        image_url=((item.get("images") or {}).get("jpg") or {}).get("image_url"),
+        synopsis=item.get("synopsis"),
+        score=item.get("score"),
+        episodes=item.get("episodes"),
+        status=item.get("status"),
+        year=item.get("year"),
+        genres=", ".join([g["name"] for g in item.get("genres") or []]),
+        studios=", ".join([s["name"] for s in item.get("studios") or []]),
+        duration=item.get("duration"),
+        type=item.get("type"),
+        popularity=item.get("popularity"),
+        favorites=item.get("favorites"),
+        members=item.get("members"),
+        source=item.get("source"),
+    )
+
+
+class TokenBucket:
+    """Async token bucket: `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AiohttpClient:
+    """Default HTTP layer for the fetcher.
+
+    Any async context manager exposing ``get_json(url) -> (status, retry_after, payload)``
+    can be passed to the fetcher instead, e.g. a client pointed at a local stub server.
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def get_json(self, url):
         try:
-            response = requests.get(f"https://api.jikan.moe/v4/anime?page={page}")
-            response.raise_for_status()
-            data = response.json()
-
-            new_anime_count = 0
-            for item in data.get("data", []):
-                mal_id = item["mal_id"]
-                if Anime.query.filter_by(mal_id=mal_id).first():
-                    continue
+            async with self._session.get(url) as response:
+                payload = await response.json() if response.status == 200 else None
+                return response.status, response.headers.get("Retry-After"), payload
+        except aiohttp.ClientError as e:
+            raise FetchError(str(e)) from e
+
+
+class IngestStats:
+    def __init__(self):
+        self.pages = 0
+        self.rows = 0
+        self.counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        self.failed_pages = []
+        self.last_page = None
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return max(time.monotonic() - self.started, 1e-9)
+
+    def report(self):
+        print(
+            f"📊 {self.pages} pages, {self.rows} rows in {self.elapsed:.1f}s — "
+            f"{self.pages / self.elapsed:.2f} pages/s, {self.rows / self.elapsed:.1f} rows/s"
+        )
+        print("   {inserted} new, {updated} updated, {unchanged} unchanged".format(**self.counts))
+        if self.failed_pages:
+            print(f"⚠️ Failed pages: {sorted(self.failed_pages)}")
+
+
+def _backoff(attempt, retry_after=None, base=1.0, cap=30.0):
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return min(cap, base * 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+async def fetch_page(client, bucket, base_url, page, max_retries=5):
+    url = f"{base_url}/anime?page={page}"
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        retry_after = None
+        try:
+            status, retry_after, payload = await client.get_json(url)
+        except (FetchError, OSError, asyncio.TimeoutError) as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            if status == 200:
+                return payload
+            if status not in RETRY_STATUSES:
+                raise FetchError(f"HTTP {status} for page {page}")
+            error = f"HTTP {status}"
+
+        if attempt == max_retries:
+            raise FetchError(f"Giving up on page {page} after {attempt + 1} attempts ({error})")
+        delay = _backoff(attempt, retry_after)
+        print(f"🔁 Page {page}: {error}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def content_hash(record):
+    """Stable digest of a mapped record, used to skip rows whose upstream content is unchanged."""
+    payload = json.dumps([record.get(field) for field in ANIME_FIELDS], default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def upsert_anime(records):
+    """Insert or refresh a batch of Anime rows keyed on mal_id.
+
+    One SELECT loads the stored content hashes for the batch; only new rows and
+    rows whose hash differs are sent through a single INSERT ... ON CONFLICT DO
+    UPDATE, so a refresh writes roughly the size of the upstream delta. Genre and
+    studio links are rebuilt for the rows that were written.
+    Returns inserted/updated/unchanged counts. The caller commits.
+    """
+    rows = {record["mal_id"]: record for record in records}
+    if not rows:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
 
-                anime = Anime(
-                    mal_id=mal_id,
-                    title=item["title"],
-                    image_url=item["images"]["jpg"].get("image_url"),
-                    synopsis=item.get("synopsis"),
-                    score=item.get("score"),
-                    episodes=item.get("episodes"),
-                    status=item.get("status"),
-                    year=item.get("year"),
-                    genres=", ".join([g["name"] for g in item.get("genres", [])]),
-                    studios=", ".join([s["name"] for s in item.get("studios", [])]),
-                    duration=item.get("duration"),
-                    type=item.get("type"),
-                    popularity=item.get("popularity"),
-                    favorites=item.get("favorites"),
-                    members=item.get("members"),
-                    source=item.get("source"),
-                )
-
-
-                db.session.add(anime)
-                new_anime_count += 1
-
-            db.session.commit()
-            print(f"✅ Page {page} complete — {new_anime_count} new entries added.")
-            time.sleep(delay)
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching page {page}: {e}")
+    existing = dict(db.session.execute(
+        select(Anime.mal_id, Anime.content_hash).where(Anime.mal_id.in_(list(rows)))
+    ).all())
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    changed = []
+    now = datetime.utcnow()
+    for mal_id, record in rows.items():
+        digest = content_hash(record)
+        if mal_id not in existing:
+            counts["inserted"] += 1
+        elif existing[mal_id] != digest:
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+        changed.append({**record, "content_hash": digest, "updated_at": now})
+
+    if changed:
+        stmt = dialect_insert(Anime.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Anime.mal_id],
+            set_={field: stmt.excluded[field] for field in changed[0] if field != "mal_id"},
+        )
+        db.session.execute(stmt, changed)
+        written = db.session.execute(
+            select(Anime.id, Anime.genres, Anime.studios)
+            .where(Anime.mal_id.in_([record["mal_id"] for record in changed]))
+        ).all()
+        link_genres_and_studios(written)
+        anime_catalog_changed.send(current_app._get_current_object(), anime_ids=[row.id for row in written])
+    return counts
+
+
+def split_names(value):
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def _replace_links(model, link_table, key, names_by_anime):
+    names = {name for names in names_by_anime.values() for name in names}
+    ids = {}
+    if names:
+        insert = dialect_insert(model.__table__).on_conflict_do_nothing(index_elements=["name"])
+        db.session.execute(insert, [{"name": name} for name in names])
+        ids = dict(db.session.execute(select(model.name, model.id).where(model.name.in_(names))).all())
+
+    db.session.execute(delete(link_table).where(link_table.c.anime_id.in_(list(names_by_anime))))
+    links = [
+        {"anime_id": anime_id, key: ids[name]}
+        for anime_id, names in names_by_anime.items()
+        for name in set(names)
+    ]
+    if links:
+        db.session.execute(link_table.insert(), links)
+
+
+def link_genres_and_studios(rows):
+    """Rebuild the anime_genre/anime_studio links for `rows` (anime_id, genres, studios)."""
+    rows = list(rows)
+    if not rows:
+        return
+    _replace_links(Genre, anime_genre, "genre_id", {row[0]: split_names(row[1]) for row in rows})
+    _replace_links(Studio, anime_studio, "studio_id", {row[0]: split_names(row[2]) for row in rows})
+
+
+def _links(anime_ids):
+    """{anime_id: (genre ids, studio ids)} as currently stored."""
+    links = {anime_id: (set(), set()) for anime_id in anime_ids}
+    for position, (link_table, key) in enumerate(((anime_genre, "genre_id"), (anime_studio, "studio_id"))):
+        for anime_id, target_id in db.session.execute(
+            select(link_table.c.anime_id, link_table.c[key]).where(link_table.c.anime_id.in_(anime_ids))
+        ):
+            links[anime_id][position].add(target_id)
+    return links
+
+
+def backfill_genre_links(batch_size=2000):
+    """Populate the genre/studio link tables from the comma-joined Anime columns.
+
+    Anime whose links actually changed get a new updated_at (and the
+    anime_catalog_changed signal), so catalog indexes in running workers pick
+    the new genres up on their next refresh. Returns (anime linked, anime changed).
+    """
+    last_id, total, changed = 0, 0, 0
+    while True:
+        rows = db.session.execute(
+            select(Anime.id, Anime.genres, Anime.studios)
+            .where(Anime.id > last_id).order_by(Anime.id).limit(batch_size)
+        ).all()
+        if not rows:
             break
-        except Exception as db_error:
-            print(f"❌ DB error: {db_error}")
-            db.session.rollback()
+        anime_ids = [row.id for row in rows]
+        before = _links(anime_ids)
+        link_genres_and_studios(rows)
+        after = _links(anime_ids)
+        changed_ids = [anime_id for anime_id in anime_ids if before[anime_id] != after[anime_id]]
+        if changed_ids:
+            db.session.execute(
+                update(Anime).where(Anime.id.in_(changed_ids)).values(updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        if changed_ids:
+            anime_catalog_changed.send(current_app._get_current_object(), anime_ids=changed_ids)
+        last_id = rows[-1].id
+        total += len(rows)
+        changed += len(changed_ids)
+        print(f"🔗 Linked {total} anime ({changed} changed)")
+    return total, changed
+
+
+def store_page(page, items):
+    """Write one fetched page; returns its upsert counts."""
+    counts = upsert_anime([anime_fields(item) for item in items])
+    db.session.commit()
+    return counts
+
+
+async def ingest_pages(pages, store=store_page, client=None, base_url=None,
+                       concurrency=3, rate=3.0, burst=None, queue_size=8, max_retries=5):
+    """Fetch `pages` concurrently under a token bucket and hand them to a single DB writer.
+
+    Fetch workers keep up to `concurrency` requests in flight and push results onto a
+    bounded queue, so a slow database applies back-pressure instead of buffering the
+    whole catalog. `store(page, items)` returns upsert counts and runs on one dedicated
+    thread inside a copy of the caller's context, which keeps every session operation
+    on the same thread and app context. Scheduling stops after the last page Jikan
+    reports or on the first page that fails for good; if the writer itself fails,
+    the fetchers are cancelled and its error is raised.
+    """
+    base_url = (base_url or "https://api.jikan.moe/v4").rstrip("/")
+    bucket = TokenBucket(rate, burst)
+    results = asyncio.Queue(maxsize=queue_size)
+    pending = iter(pages)
+    stats = IngestStats()
+    state = {"last_page": None, "stop": False}
+
+    async def fetcher(http):
+        while not state["stop"]:
+            page = next(pending, None)
+            if page is None or (state["last_page"] is not None and page > state["last_page"]):
+                return
+            try:
+                data = await fetch_page(http, bucket, base_url, page, max_retries)
+            except FetchError as e:
+                print(f"Error fetching page {page}: {e}")
+                stats.failed_pages.append(page)
+                state["stop"] = True
+                return
+
+            pagination = data.get("pagination") or {}
+            if pagination.get("has_next_page") is False or not data.get("data"):
+                last = pagination.get("last_visible_page") or page
+                state["last_page"] = min(last, state["last_page"] or last)
+            await results.put((page, data.get("data", [])))
+
+    async def writer():
+        loop = asyncio.get_running_loop()
+        context = copy_context()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="anime-writer") as executor:
+            while True:
+                entry = await results.get()
+                if entry is None:
+                    return
+                page, items = entry
+                try:
+                    counts = await loop.run_in_executor(executor, context.run, store, page, items)
+                except Exception as db_error:
+                    print(f"❌ DB error on page {page}: {db_error}")
+                    await loop.run_in_executor(executor, context.run, db.session.rollback)
+                    stats.failed_pages.append(page)
+                    continue
+                stats.pages += 1
+                stats.rows += len(items)
+                for key, value in counts.items():
+                    stats.counts[key] = stats.counts.get(key, 0) + value
+                print(f"✅ Page {page} complete — {counts['inserted']} new, {counts['updated']} updated, "
+                      f"{counts['unchanged']} unchanged "
+                      f"({stats.pages / stats.elapsed:.2f} pages/s, {stats.rows / stats.elapsed:.1f} rows/s)")
+
+    async with (client or AiohttpClient()) as http:
+        writer_task = asyncio.create_task(writer())
+        fetch_task = asyncio.gather(*(fetcher(http) for _ in range(max(1, concurrency))))
+        try:
+            await asyncio.wait({writer_task, fetch_task}, return_when=asyncio.FIRST_COMPLETED)
+            if writer_task.done():
+                # The writer only stops early by failing; nothing would drain the queue
+                fetch_task.cancel()
+                await asyncio.gather(fetch_task, return_exceptions=True)
+                writer_task.result()
+            await fetch_task
+        finally:
+            if not writer_task.done():
+                await results.put(None)
+            await writer_task
+
+    stats.last_page = state["last_page"]
+    stats.report()
+    return stats
+
+
+def fetch_and_store_anime(pages=1, concurrency=None, rate=None, client=None, base_url=None):
+    config = current_app.config
+    return asyncio.run(ingest_pages(
+        range(1, pages + 1),
+        client=client,
+        base_url=base_url or config.get("JIKAN_BASE_URL"),
+        concurrency=concurrency or config.get("JIKAN_CONCURRENCY", 3),
+        rate=rate or config.get("JIKAN_RATE_LIMIT", 3.0),
+    ))
+
+
+def sync_anime(max_pages=None, restart=False, concurrency=None, rate=None, client=None, base_url=None,
+               checkpoint_name="jikan-anime"):
+    """Incrementally refresh the catalog, resuming from the last committed page.
+
+    Each page is upserted together with the checkpoint in one transaction, so an
+    interrupted run (network failure, Ctrl-C, deploy) picks up after the highest
+    page that was fully written. Pages can finish out of order, so the checkpoint
+    only advances over a contiguous run of completed pages.
+    """
+    checkpoint = db.session.get(SyncCheckpoint, checkpoint_name)
+    if checkpoint is None:
+        checkpoint = SyncCheckpoint(name=checkpoint_name, last_page=0)
+        db.session.add(checkpoint)
+    if restart or checkpoint.status == "complete":
+        checkpoint.last_page = 0
+        checkpoint.started_at = datetime.utcnow()
+        checkpoint.finished_at = None
+    start_page = checkpoint.last_page + 1
+    checkpoint.status = "running"
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+    print(f"🔄 Syncing from page {start_page} (checkpoint '{checkpoint_name}')")
+
+    done = set()
+    watermark = {"page": checkpoint.last_page}
+
+    def store(page, items):
+        counts = upsert_anime([anime_fields(item) for item in items])
+        done.add(page)
+        while watermark["page"] + 1 in done:
+            watermark["page"] += 1
+            done.discard(watermark["page"])
+        db.session.query(SyncCheckpoint).filter_by(name=checkpoint_name).update(
+            {"last_page": watermark["page"], "updated_at": datetime.utcnow()}
+        )
+        db.session.commit()
+        return counts
+
+    pages = itertools.count(start_page) if max_pages is None else range(start_page, start_page + max_pages)
+    config = current_app.config
+    stats = asyncio.run(ingest_pages(
+        pages,
+        store=store,
+        client=client,
+        base_url=base_url or config.get("JIKAN_BASE_URL"),
+        concurrency=concurrency or config.get("JIKAN_CONCURRENCY", 3),
+        rate=rate or config.get("JIKAN_RATE_LIMIT", 3.0),
+    ))
+
+    checkpoint = db.session.get(SyncCheckpoint, checkpoint_name)
+    db.session.refresh(checkpoint)
+    finished = not stats.failed_pages and stats.last_page is not None and checkpoint.last_page >= stats.last_page
+    checkpoint.status = "complete" if finished else "interrupted"
+    checkpoint.finished_at = datetime.utcnow() if finished else None
+    db.session.commit()
+    if finished:
+        print("✅ Sync complete.")
+    else:
+        print(f"⏸️ Sync stopped; next run resumes at page {checkpoint.last_page + 1}.")
+    return stats
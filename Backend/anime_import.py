@@ -0,0 +1,72 @@
+import gzip
+import json
+import time
+
+from Backend.anime_fetcher import anime_fields, upsert_anime
+from Backend.models import db
+
+
+def _open_dump(path):
+    with open(path, "rb") as fh:
+        magic = fh.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_dump_records(path):
+    """Yield Jikan anime records from a JSON Lines dump, one line at a time.
+
+    Each line is either a single anime record or a page as returned by
+    /v4/anime (``{"data": [...], ...}``). Gzip'd dumps are detected by their
+    magic bytes. Lines that cannot be parsed are reported and skipped.
+    """
+    with _open_dump(path) as fh:
+        for line_no, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                print(f"⚠️ Line {line_no}: invalid JSON ({e})")
+                continue
+            if "mal_id" not in entry and "data" in entry:
+                data = entry["data"]
+                yield from (data if isinstance(data, list) else [data])
+            else:
+                yield entry
+
+
+def import_anime_dump(path, batch_size=2000):
+    """Stream a dump file into the Anime table in large upsert batches."""
+    started = time.monotonic()
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    skipped = 0
+    batch = []
+
+    def flush():
+        counts = upsert_anime(batch)
+        db.session.commit()
+        for key, value in counts.items():
+            totals[key] += value
+        batch.clear()
+        processed = sum(totals.values())
+        print(f"📦 {processed} records ({processed / (time.monotonic() - started):.0f} rows/s)")
+
+    for item in iter_dump_records(path):
+        try:
+            batch.append(anime_fields(item))
+        except (KeyError, TypeError, AttributeError) as e:
+            skipped += 1
+            print(f"⚠️ Skipping malformed record {item.get('mal_id') if isinstance(item, dict) else item!r}: {e!r}")
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.monotonic() - started
+    print(f"✅ Import finished in {elapsed:.1f}s — {totals['inserted']} new, {totals['updated']} updated, "
+          f"{totals['unchanged']} unchanged, {skipped} skipped")
+    return totals
@@ -0,0 +1,60 @@
+from sqlalchemy import func, select, true, update
+
+from Backend.models import db, BroadcastNotification, User
+from Backend.realtime import broadcast_event, event_hub
+
+
+def broadcast_item(broadcast, last_seen_id):
+    """A broadcast shaped like a notification inbox item."""
+    return dict(broadcast_event(broadcast), is_read=broadcast.id <= last_seen_id, created_at=broadcast.created_at)
+
+
+def create_broadcast(message, news_id=None, created_by=None):
+    """Store one broadcast for every user: a single row, whatever the number of users. The caller commits."""
+    broadcast = BroadcastNotification(message=message, news_id=news_id, created_by=created_by)
+    db.session.add(broadcast)
+    db.session.flush()
+    return broadcast
+
+
+def publish_broadcast(broadcast):
+    """Push a committed broadcast to every open stream in this process."""
+    event_hub.publish_all('broadcast', broadcast.id, broadcast_event(broadcast))
+
+
+def _visible(user):
+    # Users only get broadcasts sent since they signed up
+    return BroadcastNotification.created_at >= user.created_at if user.created_at else true()
+
+
+def unseen_broadcast_count(user):
+    """Broadcasts above the user's watermark: a primary-key range count."""
+    return db.session.scalar(
+        select(func.count()).where(BroadcastNotification.id > user.last_seen_broadcast_id, _visible(user))
+    )
+
+
+def broadcasts_for(user, newer_than=None, older_than=None, unseen_only=False):
+    """The user's broadcasts with created_at in [newer_than, older_than), newest first, as inbox items."""
+    query = select(BroadcastNotification).where(_visible(user))
+    if newer_than is not None:
+        query = query.where(BroadcastNotification.created_at >= newer_than)
+    if older_than is not None:
+        query = query.where(BroadcastNotification.created_at < older_than)
+    if unseen_only:
+        query = query.where(BroadcastNotification.id > user.last_seen_broadcast_id)
+    rows = db.session.execute(
+        query.order_by(BroadcastNotification.created_at.desc(), BroadcastNotification.id.desc())
+    ).scalars()
+    return [broadcast_item(row, user.last_seen_broadcast_id) for row in rows]
+
+
+def mark_broadcasts_seen(user_id, up_to_id=None):
+    """Move the user's watermark forward to `up_to_id` (default: the newest broadcast); never backwards."""
+    if up_to_id is None:
+        up_to_id = db.session.scalar(select(func.max(BroadcastNotification.id))) or 0
+    db.session.execute(
+        update(User).where(User.id == user_id, User.last_seen_broadcast_id < up_to_id)
+        .values(last_seen_broadcast_id=up_to_id)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from Backend.models import db, Anime
+from Backend.signals import anime_catalog_changed
+
+
+class CatalogCache:
+    """Base for per-process, read-mostly views of the Anime table.
+
+    The catalog only changes when an ingestion job runs, usually in another
+    process. Subclasses therefore keep their structures in memory and call
+    ``ensure_fresh()`` before serving. At most every CATALOG_REFRESH_SECONDS it
+    compares MAX(anime.updated_at) (an index lookup) with the watermark it last
+    loaded. When the catalog moved, ``apply_changes`` gets just the changed rows
+    and the watermark moves to the newest ``updated_at`` among them.
+    Writes made in this process are picked up on the next call through the
+    ``anime_catalog_changed`` signal.
+    """
+
+    # Changes touching more than this share of the catalog trigger a full rebuild
+    rebuild_ratio = 0.2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._watermark = None
+        self._checked_at = 0.0
+        self.size = 0
+        anime_catalog_changed.connect(self._mark_dirty, weak=False)
+
+    def _mark_dirty(self, sender, **kwargs):
+        self._dirty = True
+
+    def ensure_fresh(self):
+        interval = current_app.config.get("CATALOG_REFRESH_SECONDS", 30)
+        if self._loaded and not self._dirty and time.monotonic() - self._checked_at < interval:
+            return
+        with self._lock:
+            if self._loaded and not self._dirty and time.monotonic() - self._checked_at < interval:
+                return
+            self._dirty = False
+            latest = db.session.execute(select(func.max(Anime.updated_at))).scalar()
+            if not self._loaded:
+                # Read before the rebuild: anything committed meanwhile is applied again next time
+                self._watermark = latest
+                self.rebuild()
+            elif latest is not None and (self._watermark is None or latest > self._watermark):
+                changed = db.session.execute(
+                    select(Anime).where(Anime.updated_at > self._watermark) if self._watermark
+                    else select(Anime).where(Anime.updated_at.isnot(None))
+                ).scalars().all()
+                if len(changed) > self.rebuild_ratio * max(self.size, 1):
+                    self.rebuild()
+                else:
+                    self.apply_changes(changed)
+                # Only as far as the rows actually read, never a time taken outside the query
+                self._watermark = max((row.updated_at for row in changed), default=self._watermark)
+            self._loaded = True
+            self._checked_at = time.monotonic()
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def apply_changes(self, rows):
+        self.rebuild()
@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+
+from flask import current_app
+from sqlalchemy import select
+
+from Backend.catalog_cache import CatalogCache
+from Backend.models import db, Anime, Genre, anime_genre
+
+try:
+    import numpy as np
+except ImportError:  # optional: without NumPy every query goes to the database
+    np = None
+
+# sort name -> (column, descending), matching BROWSE_SORTS in routes/anime.py
+SORTS = {
+    "id": ("id", False),
+    "score": ("score", True),
+    "popularity": ("popularity", False),
+    "year": ("year", True),
+}
+
+
+def _sort_key(values, descending):
+    """Float keys whose ascending order is the wanted order, NULL (NaN) last."""
+    keys = -values if descending else values.copy()
+    keys[np.isnan(keys)] = np.inf
+    return keys
+
+
+class _Columns:
+    """One immutable build of the snapshot; replaced wholesale on reload."""
+
+    def __init__(self, rows, genre_links):
+        n = len(rows)
+        self.ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=n)
+        self.position = {int(anime_id): i for i, anime_id in enumerate(self.ids)}
+
+        def floats(attr):
+            return np.array([getattr(row, attr) if getattr(row, attr) is not None else np.nan for row in rows],
+                            dtype=np.float64)
+
+        self.columns = {
+            "id": self.ids.astype(np.float64),
+            "score": floats("score"),
+            "popularity": floats("popularity"),
+            "year": floats("year"),
+        }
+        self.type_names = sorted({row.type for row in rows if row.type})
+        self.status_names = sorted({row.status for row in rows if row.status})
+        type_codes = {name: i + 1 for i, name in enumerate(self.type_names)}
+        status_codes = {name: i + 1 for i, name in enumerate(self.status_names)}
+        self.type_code = np.array([type_codes.get(row.type, 0) for row in rows], dtype=np.uint8)
+        self.status_code = np.array([status_codes.get(row.status, 0) for row in rows], dtype=np.uint8)
+
+        # One bit per genre, packed into as many uint64 words as the genre list needs
+        self.genre_names = sorted({name for _, name in genre_links})
+        self.genre_bit = {name.lower(): i for i, name in enumerate(self.genre_names)}
+        self.genre_mask = np.zeros((n, max(1, (len(self.genre_names) + 63) // 64)), dtype=np.uint64)
+        for anime_id, name in genre_links:
+            i = self.position.get(anime_id)
+            if i is not None:
+                bit = self.genre_bit[name.lower()]
+                self.genre_mask[i, bit // 64] |= np.uint64(1 << (bit % 64))
+
+        self.orders, self.keys = {}, {}
+        for sort, (column, descending) in SORTS.items():
+            key = _sort_key(self.columns[column], descending)
+            tiebreak = -self.ids if descending else self.ids
+            self.keys[sort] = (key, tiebreak)
+            self.orders[sort] = np.lexsort((tiebreak, key))
+
+        # Rendering fields for browse/home cards, so hits never go back to the DB
+        self.items = [
+            {"id": row.id, "title": row.title, "image_url": row.image_url, "score": row.score,
+             "episodes": row.episodes, "year": row.year, "status": row.status, "popularity": row.popularity}
+            for row in rows
+        ]
+
+    def nbytes(self):
+        arrays = [self.ids, self.type_code, self.status_code, self.genre_mask,
+                  *self.columns.values(), *self.orders.values(),
+                  *(array for pair in self.keys.values() for array in pair)]
+        total = sum(array.nbytes for array in arrays)
+        total += sys.getsizeof(self.items) + sum(
+            sys.getsizeof(item) + sum(sys.getsizeof(v) for v in item.values()) for item in self.items
+        )
+        return total + sys.getsizeof(self.position) * 2
+
+
+class CatalogSnapshot(CatalogCache):
+    """Optional columnar copy of the catalog answering browse filters and sorts in NumPy.
+
+    Enabled with CATALOG_SNAPSHOT=True when NumPy is installed. Filters become
+    boolean masks over the columns; each sort order is a precomputed permutation,
+    so a page is one mask, one gather and one slice. A reload builds a new
+    ``_Columns`` and swaps it in, so requests never see a partial snapshot.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._columns = None
+        self.built_at = None
+        self.build_seconds = None
+
+    @property
+    def enabled(self):
+        return np is not None and current_app.config.get("CATALOG_SNAPSHOT", False)
+
+    def rebuild(self):
+        started = time.monotonic()
+        rows = db.session.execute(
+            select(Anime.id, Anime.title, Anime.image_url, Anime.score, Anime.episodes, Anime.year,
+                   Anime.status, Anime.type, Anime.popularity).order_by(Anime.id)
+        ).all()
+        links = db.session.execute(
+            select(anime_genre.c.anime_id, Genre.name).join(Genre, Genre.id == anime_genre.c.genre_id)
+        ).all()
+        columns = _Columns(rows, links)
+        self._columns = columns
+        self.size = len(rows)
+        self.built_at = time.time()
+        self.build_seconds = time.monotonic() - started
+        print(f"🧮 Catalog snapshot (pid {os.getpid()}): {self.size} anime, "
+              f"{columns.nbytes() / 1024 / 1024:.1f} MiB, built in {self.build_seconds:.2f}s")
+
+    def stats(self):
+        columns = self._columns
+        return {
+            "enabled": self.enabled,
+            "pid": os.getpid(),
+            "rows": self.size,
+            "bytes": columns.nbytes() if columns else 0,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+        }
+
+    def _mask(self, columns, genres=(), genre_mode="any", types=(), statuses=(), years=()):
+        mask = np.ones(len(columns.ids), dtype=bool)
+        if genres:
+            wanted = np.zeros(columns.genre_mask.shape[1], dtype=np.uint64)
+            missing = False
+            for name in genres:
+                bit = columns.genre_bit.get(name.lower())
+                if bit is None:
+                    missing = True
+                    continue
+                wanted[bit // 64] |= np.uint64(1 << (bit % 64))
+            hits = columns.genre_mask & wanted
+            if genre_mode == "all":
+                mask &= (not missing) & np.all(hits == wanted, axis=1)
+            else:
+                mask &= np.any(hits != 0, axis=1)
+        for values, names, codes in ((types, columns.type_names, columns.type_code),
+                                     (statuses, columns.status_names, columns.status_code)):
+            if values:
+                wanted_codes = [names.index(v) + 1 for v in values if v in names]
+                mask &= np.isin(codes, wanted_codes)
+        if years:
+            mask &= np.isin(columns.columns["year"], [float(y) for y in years])
+        return mask
+
+    def browse(self, sort="id", page=None, after=None, limit=20, with_total=True, **filters):
+        """Return (items, total, next_after) for one page of a filtered, sorted browse.
+
+        Pass `page` for offset pages or `after` ((value, id) of the last row, or
+        None) for keyset pages; both follow the same order as the SQL path.
+        """
+        self.ensure_fresh()
+        columns = self._columns
+        column, descending = SORTS[sort]
+        mask = self._mask(columns, **filters)
+        total = int(mask.sum()) if with_total else None
+        order = columns.orders[sort]
+
+        if page is not None:
+            matching = order[mask[order]]
+            start = (page - 1) * limit
+            chosen = matching[start:start + limit]
+            return [columns.items[i] for i in chosen], total, None
+
+        if after is not None:
+            key, tiebreak = columns.keys[sort]
+            value, last_id = after
+            cursor_key = np.inf if value is None else (-float(value) if descending else float(value))
+            cursor_tiebreak = -last_id if descending else last_id
+            mask &= (key > cursor_key) | ((key == cursor_key) & (tiebreak > cursor_tiebreak))
+        matching = order[mask[order]]
+        chosen = matching[:limit + 1]
+        items = [columns.items[i] for i in chosen[:limit]]
+        next_after = None
+        if len(chosen) > limit:
+            last = items[-1]
+            next_after = (last[column], last["id"])
+        return items, total, next_after
+
+    def top(self, sort, limit, minimum_score=None):
+        """Best `limit` items in `sort` order, e.g. for the home page lists."""
+        self.ensure_fresh()
+        columns = self._columns
+        order = columns.orders[sort]
+        if minimum_score is not None:
+            scores = columns.columns["score"]
+            order = order[scores[order] > minimum_score]
+        return [columns.items[i] for i in order[:limit]]
+
+
+catalog_snapshot = CatalogSnapshot()
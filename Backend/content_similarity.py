@@ -0,0 +1,218 @@
+import math
+import re
+import time
+from collections import Counter
+
+from sqlalchemy import select
+
+from Backend.anime_fetcher import split_names
+from Backend.catalog_cache import CatalogCache
+from Backend.models import db, Anime
+
+try:
+    import numpy as np
+except ImportError:  # optional: without NumPy "more like this" is unavailable
+    np = None
+
+_WORD_RE = re.compile(r"[a-z]{3,}")
+
+STOPWORDS = frozenset("""
+    the and for are but not you all any can her was one our out his has him how its who did get
+    may new now old see two way boy let put say she too use with that this from they will have
+    been were into when what your their them then than also more some only over such after about
+    which while where there these those other being would could should each most very just
+    written source anime series story""".split())
+
+# Share of the final (unit length) vector given to each feature block
+BLOCK_WEIGHTS = {
+    "synopsis": 0.5,
+    "genre": 0.3,
+    "studio": 0.1,
+    "type": 0.05,
+    "source": 0.05,
+}
+
+
+def _features(synopsis, genres, studios, type_, source):
+    """Raw {block: Counter(feature)} for one anime, before weighting."""
+    return {
+        "synopsis": Counter(w for w in _WORD_RE.findall((synopsis or "").lower()) if w not in STOPWORDS),
+        "genre": Counter(f"genre:{name.lower()}" for name in split_names(genres)),
+        "studio": Counter(f"studio:{name.lower()}" for name in split_names(studios)),
+        "type": Counter([f"type:{type_.lower()}"] if type_ else []),
+        "source": Counter([f"source:{source.lower()}"] if source else []),
+    }
+
+
+class _Matrix:
+    """Unit vectors of a set of anime, stored column-wise (feature -> postings)."""
+
+    def __init__(self, anime_ids, vectors, n_features):
+        self.ids = np.asarray(anime_ids, dtype=np.int64)
+        lengths = np.array([len(cols) for cols, _ in vectors], dtype=np.int64)
+        cols = np.concatenate([c for c, _ in vectors]) if vectors else np.zeros(0, dtype=np.int32)
+        vals = np.concatenate([v for _, v in vectors]) if vectors else np.zeros(0, dtype=np.float32)
+        rows = np.repeat(np.arange(len(vectors), dtype=np.int32), lengths)
+        order = np.argsort(cols, kind="stable")
+        self.rows = rows[order]
+        self.vals = vals[order]
+        self.indptr = np.zeros(n_features + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=n_features), out=self.indptr[1:])
+        self.live = np.ones(len(self.ids), dtype=bool)
+
+    def scores(self, queries):
+        """Dot products of every query vector with every stored vector, shape (len(queries), len(ids))."""
+        n = len(self.ids)
+        if not n or not queries:
+            return np.zeros((len(queries), n), dtype=np.float64)
+        q_batch = np.concatenate([np.full(len(c), b, dtype=np.int64) for b, (c, _) in enumerate(queries)])
+        q_cols = np.concatenate([c for c, _ in queries])
+        q_vals = np.concatenate([v for _, v in queries])
+        starts = self.indptr[q_cols]
+        lengths = self.indptr[q_cols + 1] - starts
+        total = int(lengths.sum())
+        # Flat positions of every posting touched: start of its run plus offset within it
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        keys = np.repeat(q_batch, lengths) * n + self.rows[offsets]
+        weights = self.vals[offsets] * np.repeat(q_vals, lengths)
+        scores = np.bincount(keys, weights=weights, minlength=len(queries) * n).reshape(len(queries), n)
+        scores[:, ~self.live] = 0.0
+        return scores
+
+
+class _State:
+    __slots__ = ("features", "idf", "base", "delta", "vectors")
+
+    def __init__(self, features, idf, base, delta, vectors):
+        self.features = features
+        self.idf = idf
+        self.base = base
+        self.delta = delta
+        self.vectors = vectors
+
+
+class ContentSimilarityIndex(CatalogCache):
+    """TF-IDF "more like this" index over synopsis, genres, studios, type and source.
+
+    Each anime becomes one L2-normalized sparse vector: a TF-IDF block for the
+    synopsis plus IDF-weighted genre/studio/type/source features, mixed by
+    ``BLOCK_WEIGHTS``. Vectors sit column-wise in NumPy arrays, so scoring a
+    batch of queries against the whole catalog is one ``bincount`` over the
+    postings of the query features. Titles added or changed after a rebuild are
+    vectorized with the frozen vocabulary and IDF into a small delta matrix and
+    merged into the base once it grows past ``max_delta``.
+    """
+
+    max_delta = 1024
+    min_df = 2
+    max_df_ratio = 0.5
+
+    def __init__(self):
+        super().__init__()
+        self._state = None
+        self.build_seconds = None
+
+    @property
+    def enabled(self):
+        return np is not None
+
+    def rebuild(self):
+        started = time.monotonic()
+        rows = db.session.execute(
+            select(Anime.id, Anime.synopsis, Anime.genres, Anime.studios, Anime.type, Anime.source)
+        ).all()
+        raw = {row.id: _features(*row[1:]) for row in rows}
+        df = Counter(feature for blocks in raw.values() for counts in blocks.values() for feature in counts)
+        n = max(len(raw), 1)
+        features, idf = {}, []
+        for feature, count in df.items():
+            # Synopsis words need a minimum spread; metadata features are always kept
+            if ":" not in feature and not (self.min_df <= count <= self.max_df_ratio * n):
+                continue
+            features[feature] = len(features)
+            idf.append(math.log((1 + n) / (1 + count)) + 1)
+        idf = np.array(idf, dtype=np.float64)
+
+        vectors = {anime_id: self._vectorize(blocks, features, idf) for anime_id, blocks in raw.items()}
+        ids = list(vectors)
+        base = _Matrix(ids, [vectors[i] for i in ids], len(features))
+        self._state = _State(features, idf, base, _Matrix([], [], len(features)), vectors)
+        self.size = len(vectors)
+        self.build_seconds = time.monotonic() - started
+        print(f"🧭 Content index: {self.size} anime, {len(features)} features, "
+              f"{len(base.vals)} weights, built in {self.build_seconds:.2f}s")
+
+    @staticmethod
+    def _vectorize(blocks, features, idf):
+        cols, vals = [], []
+        for block, counts in blocks.items():
+            weights = {}
+            for feature, tf in counts.items():
+                col = features.get(feature)
+                if col is not None:
+                    weights[col] = (1 + math.log(tf)) * idf[col]
+            norm = math.sqrt(sum(w * w for w in weights.values()))
+            if not norm:
+                continue
+            scale = math.sqrt(BLOCK_WEIGHTS[block]) / norm
+            cols.extend(weights)
+            vals.extend(w * scale for w in weights.values())
+        vals = np.array(vals, dtype=np.float32)
+        norm = float(np.sqrt((vals.astype(np.float64) ** 2).sum()))
+        if norm:
+            vals /= norm
+        return np.array(cols, dtype=np.int32), vals
+
+    def apply_changes(self, rows):
+        state = self._state
+        vectors = dict(state.vectors)
+        for anime in rows:
+            blocks = _features(anime.synopsis, anime.genres, anime.studios, anime.type, anime.source)
+            vectors[anime.id] = self._vectorize(blocks, state.features, state.idf)
+        changed = {anime.id for anime in rows}
+        delta_ids = [i for i in state.delta.ids.tolist() if i not in changed] + sorted(changed)
+
+        if len(delta_ids) > self.max_delta:
+            ids = list(vectors)
+            base, delta_ids = _Matrix(ids, [vectors[i] for i in ids], len(state.features)), []
+        else:
+            base = state.base
+            stale = np.isin(base.ids, delta_ids)
+            if stale.any():
+                # Copy the mask rather than the matrix, so in-flight readers keep a consistent view
+                base = _Matrix.__new__(_Matrix)
+                base.__dict__.update(state.base.__dict__)
+                base.live = state.base.live & ~stale
+        delta = _Matrix(delta_ids, [vectors[i] for i in delta_ids], len(state.features))
+        self._state = _State(state.features, state.idf, base, delta, vectors)
+        self.size = len(vectors)
+
+    def similar_many(self, anime_ids, k=10):
+        """{anime_id: [(neighbor_id, score), ...]} for a batch of anime, best first."""
+        self.ensure_fresh()
+        state = self._state
+        known = [anime_id for anime_id in anime_ids if anime_id in state.vectors]
+        if not known:
+            return {anime_id: [] for anime_id in anime_ids}
+        queries = [state.vectors[anime_id] for anime_id in known]
+        scores = np.hstack([state.base.scores(queries), state.delta.scores(queries)])
+        ids = np.concatenate([state.base.ids, state.delta.ids])
+
+        result = {anime_id: [] for anime_id in anime_ids}
+        limit = min(k + 1, scores.shape[1])
+        if not limit:
+            return result
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        for row, anime_id in enumerate(known):
+            best = sorted(zip(scores[row, top[row]].tolist(), ids[top[row]].tolist()), reverse=True)
+            result[anime_id] = [
+                (neighbor_id, round(score, 6)) for score, neighbor_id in best
+                if neighbor_id != anime_id and score > 0
+            ][:k]
+        return result
+
+    def similar(self, anime_id, k=10):
+        return self.similar_many([anime_id], k)[anime_id]
+
+
+content_index = ContentSimilarityIndex()
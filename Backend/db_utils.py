@@ -0,0 +1,13 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+from Backend.extensions import db
+
+
+def dialect_insert(table):
+    """Return an INSERT for `table` that supports ``on_conflict_do_*`` on the bound database."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
@@ -0,0 +1,103 @@
+from sqlalchemy import select
+
+from Backend.catalog_cache import CatalogCache
+from Backend.models import db, Anime, Genre, anime_genre
+
+FACETS = ("genre", "type", "status", "year")
+
+
+def _bitset(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+class FacetIndex(CatalogCache):
+    """Per-value bitsets over the catalog for cross-filtered facet counts.
+
+    Every anime gets a bit position; each facet value (a genre, type, status or
+    year) keeps a Python int with the bits of the anime carrying it. A count is
+    then one AND plus ``int.bit_count()`` over a few KB, so all facets for any
+    filter combination come back from a single call without touching the DB.
+    The whole index is rebuilt (a few hundred ms at 25k titles) when the catalog
+    changes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._state = ({facet: {} for facet in FACETS}, 0, {})
+
+    def rebuild(self):
+        rows = db.session.execute(
+            select(Anime.id, Anime.type, Anime.status, Anime.year).order_by(Anime.id)
+        ).all()
+        position = {row.id: i for i, row in enumerate(rows)}
+        members = {facet: {} for facet in FACETS}
+        for row in rows:
+            for facet, value in (("type", row.type), ("status", row.status), ("year", row.year)):
+                if value is not None:
+                    members[facet].setdefault(value, []).append(position[row.id])
+        for anime_id, name in db.session.execute(
+            select(anime_genre.c.anime_id, Genre.name).join(Genre, Genre.id == anime_genre.c.genre_id)
+        ):
+            if anime_id in position:
+                members["genre"].setdefault(name, []).append(position[anime_id])
+
+        size = len(rows)
+        bits = {
+            facet: {value: _bitset(positions, size) for value, positions in values.items()}
+            for facet, values in members.items()
+        }
+        self._state = (bits, (1 << size) - 1, position)
+        self.size = size
+
+    @staticmethod
+    def _filter_mask(bits, everything, facet, values, match_all):
+        lookup = {str(value).lower(): mask for value, mask in bits[facet].items()}
+        masks = [lookup.get(str(value).lower(), 0) for value in values]
+        if match_all:
+            mask = everything
+            for m in masks:
+                mask &= m
+            return mask
+        mask = 0
+        for m in masks:
+            mask |= m
+        return mask
+
+    def counts(self, filters, genre_mode="any", within=None):
+        """Counts per facet value under `filters` ({facet: [values]}).
+
+        Each facet is counted with every filter except its own applied, so the
+        chips of an active facet still show what selecting a sibling would give
+        (genres in ``all`` mode keep their own filter, since they intersect).
+        `within`, if given, is the set of anime ids matching the filters that
+        aren't facets (title, studio); every count is restricted to it.
+        """
+        self.ensure_fresh()
+        bits, everything, position = self._state
+        if within is not None:
+            everything = _bitset((position[anime_id] for anime_id in within if anime_id in position),
+                                 len(position))
+        masks = {
+            facet: self._filter_mask(bits, everything, facet, values, facet == "genre" and genre_mode == "all")
+            for facet, values in filters.items() if values
+        }
+
+        def combined(skip=None):
+            mask = everything
+            for facet, m in masks.items():
+                if facet != skip:
+                    mask &= m
+            return mask
+
+        result = {}
+        for facet in FACETS:
+            # With AND semantics, picking another genre narrows the current set
+            base = combined() if facet == "genre" and genre_mode == "all" else combined(skip=facet)
+            result[facet] = {value: (base & m).bit_count() for value, m in bits[facet].items()}
+        return combined().bit_count(), result
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,183 @@
+"""Database-native full-text search.
+
+SQLite uses an external-content FTS5 table kept current by triggers; PostgreSQL
+uses a generated, weighted tsvector column with a GIN index. Both are maintained
+by the database on every INSERT/UPDATE/DELETE (including the fetcher's bulk
+upserts), so application code only has to call ``search``.
+"""
+import re
+
+from sqlalchemy import text
+
+from Backend.extensions import db
+
+
+class SearchIndex:
+    """A searchable table: `columns` is a list of (column, weight) in rank order."""
+
+    def __init__(self, name, table, columns, snippet_column):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.snippet_column = snippet_column
+
+    @property
+    def fts_table(self):
+        return f"{self.table}_fts"
+
+    @property
+    def column_names(self):
+        return [column for column, _ in self.columns]
+
+
+INDEXES = {
+    "anime": SearchIndex("anime", "anime", [("title", "A"), ("synopsis", "B")], "synopsis"),
+    "post": SearchIndex("post", "post", [("title", "A"), ("content", "B")], "content"),
+    "post_comment": SearchIndex("post_comment", "post_comment", [("text", "B")], "text"),
+}
+
+# bm25 column weights for SQLite, mirroring the PostgreSQL A/B/C/D weights
+_SQLITE_WEIGHTS = {"A": 10.0, "B": 2.0, "C": 1.0, "D": 0.5}
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def query_terms(query):
+    return _TERM_RE.findall(query or "")[:12]
+
+
+def _sqlite_match(terms, prefix):
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _pg_tsquery(terms, prefix):
+    parts = [term.replace("'", "") for term in terms]
+    if prefix:
+        parts[-1] += ":*"
+    return " & ".join(parts)
+
+
+def ensure_search_schema(index):
+    """Create the full-text structures for `index` if missing; returns True if created."""
+    dialect = _dialect()
+    columns = index.column_names
+    if dialect == "sqlite":
+        exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": index.fts_table},
+        ).first()
+        if exists:
+            return False
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+        fts = index.fts_table
+        statements = [
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{index.table}', "
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {index.table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {index.table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {index.table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ]
+    elif dialect == "postgresql":
+        exists = db.session.execute(
+            text("SELECT 1 FROM information_schema.columns "
+                 "WHERE table_name = :table AND column_name = 'search_vector'"),
+            {"table": index.table},
+        ).first()
+        if exists:
+            return False
+        vector = " || ".join(
+            f"setweight(to_tsvector('english', coalesce({column}, '')), '{weight}')"
+            for column, weight in index.columns
+        )
+        statements = [
+            f'ALTER TABLE "{index.table}" ADD COLUMN search_vector tsvector '
+            f"GENERATED ALWAYS AS ({vector}) STORED",
+            f'CREATE INDEX ix_{index.table}_search_vector ON "{index.table}" USING GIN (search_vector)',
+        ]
+    else:
+        return False
+
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+    return True
+
+
+def rebuild_search_index(index):
+    """Re-derive the index from the base table (SQLite only; PostgreSQL columns are generated)."""
+    if _dialect() == "sqlite":
+        ensure_search_schema(index)
+        db.session.execute(text(f"INSERT INTO {index.fts_table}({index.fts_table}) VALUES ('rebuild')"))
+        db.session.commit()
+
+
+def search(index, query, limit=20, offset=0, prefix=True, where=None, params=None, max_candidates=None):
+    """Ranked matches for `query` as a list of (id, rank, snippet), best first.
+
+    Terms are ANDed; with `prefix` the last term also matches as a prefix, for
+    search-as-you-type. `where` is an optional SQL predicate on the base table
+    (aliased ``t``) with its bind `params`.
+
+    Ranking costs time per matching row, so a very common term in a large table
+    is slow to rank in full. With `max_candidates`, only the newest (highest id)
+    that many matches are ranked; finding that id range is a cheap walk of the
+    index in id order.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    params = dict(params or {}, limit=limit, offset=offset)
+    extra = f"AND {where}" if where else ""
+
+    if _dialect() == "sqlite":
+        weights = ", ".join(str(_SQLITE_WEIGHTS[weight]) for _, weight in index.columns)
+        snippet_idx = index.column_names.index(index.snippet_column)
+        fts = index.fts_table
+        params["match"] = _sqlite_match(terms, prefix)
+        if max_candidates:
+            floor = db.session.execute(text(
+                f"SELECT {fts}.rowid FROM {fts} JOIN {index.table} t ON t.id = {fts}.rowid "
+                f"WHERE {fts} MATCH :match {extra} ORDER BY {fts}.rowid DESC LIMIT 1 OFFSET :skip"
+            ), dict(params, skip=max_candidates - 1)).scalar()
+            if floor is not None:
+                extra += f" AND {fts}.rowid >= :floor"
+                params["floor"] = floor
+        sql = (
+            f"SELECT {fts}.rowid AS id, bm25({fts}, {weights}) AS rank, "
+            f"snippet({fts}, {snippet_idx}, '<b>', '</b>', '…', 16) AS snippet "
+            f"FROM {fts} JOIN {index.table} t ON t.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :match {extra} ORDER BY rank LIMIT :limit OFFSET :offset"
+        )
+        return [(row.id, -row.rank, row.snippet) for row in db.session.execute(text(sql), params)]
+
+    params["tsquery"] = _pg_tsquery(terms, prefix)
+    if max_candidates:
+        floor = db.session.execute(text(
+            f'SELECT t.id FROM "{index.table}" t WHERE t.search_vector @@ to_tsquery(\'english\', :tsquery) '
+            f"{extra} ORDER BY t.id DESC LIMIT 1 OFFSET :skip"
+        ), dict(params, skip=max_candidates - 1)).scalar()
+        if floor is not None:
+            extra += " AND t.id >= :floor"
+            params["floor"] = floor
+    sql = (
+        f"SELECT hits.id, hits.rank, ts_headline('english', coalesce(hits.body, ''), hits.q, "
+        f"'StartSel=<b>, StopSel=</b>, MaxWords=24, MinWords=8') AS snippet FROM ("
+        f"SELECT t.id, t.{index.snippet_column} AS body, q, ts_rank_cd(t.search_vector, q) AS rank "
+        f'FROM "{index.table}" t, to_tsquery(\'english\', :tsquery) q '
+        f"WHERE t.search_vector @@ q {extra} ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+        f") hits ORDER BY hits.rank DESC"
+    )
+    return [(row.id, row.rank, row.snippet) for row in db.session.execute(text(sql), params)]
@@ -0,0 +1,114 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, select, update
+
+from Backend.models import db, Post, PostComment
+
+# Reddit-style ranking: log-scaled engagement plus a creation-time term, so a
+# post needs 10x the engagement to outrank one HOT_DECAY_SECONDS newer.
+HOT_EPOCH = datetime(2020, 1, 1)
+HOT_DECAY_SECONDS = 45000
+COMMENT_WEIGHT = 2
+# Comments newer than this count towards a post's velocity
+VELOCITY_WINDOW = timedelta(hours=24)
+# Posts active within this span are refreshed; one extra window past the
+# velocity window lets their boost decay back to zero
+ACTIVE_WINDOW = 2 * VELOCITY_WINDOW
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def hot_score(likes, dislikes, recent_comments, created_at):
+    engagement = (likes or 0) - (dislikes or 0) + COMMENT_WEIGHT * (recent_comments or 0)
+    order = math.log10(max(abs(engagement), 1))
+    sign = 1 if engagement > 0 else -1 if engagement < 0 else 0
+    age = ((created_at or HOT_EPOCH) - HOT_EPOCH).total_seconds()
+    return round(sign * order + age / HOT_DECAY_SECONDS, 7)
+
+
+def refresh_hot_scores(full=False, now=None, batch_size=1000):
+    """Recompute Post.hot_score for recently active posts (or all with `full`); returns rows updated.
+
+    `full` also backfills comment_count and last_activity_at for posts that
+    predate those columns.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - VELOCITY_WINDOW
+    if full:
+        comments = (
+            select(func.count()).where(PostComment.post_id == Post.id).scalar_subquery()
+        )
+        db.session.execute(
+            update(Post).values(comment_count=comments,
+                                last_activity_at=func.coalesce(Post.last_activity_at, Post.created_at))
+            .execution_options(synchronize_session=False)
+        )
+
+    statement = (
+        update(Post.__table__).where(Post.__table__.c.id == bindparam("post_id"))
+        .values(hot_score=bindparam("score"))
+    )
+    updated = 0
+    for rows in _batches(full, now, batch_size):
+        ids = [row.id for row in rows]
+        recent = dict(db.session.execute(
+            select(PostComment.post_id, func.count())
+            .where(PostComment.post_id.in_(ids), PostComment.created_at >= cutoff)
+            .group_by(PostComment.post_id)
+        ).all())
+        db.session.execute(statement, [
+            {"post_id": row.id,
+             "score": hot_score(row.like_count, row.dislike_count, recent.get(row.id, 0), row.created_at)}
+            for row in rows
+        ])
+        db.session.commit()
+        updated += len(rows)
+    return updated
+
+
+def _batches(full, now, batch_size):
+    columns = select(Post.id, Post.like_count, Post.dislike_count, Post.created_at)
+    if full:
+        last_id = 0
+        while rows := db.session.execute(
+            columns.where(Post.id > last_id).order_by(Post.id).limit(batch_size)
+        ).all():
+            yield rows
+            last_id = rows[-1].id
+        return
+    # Unordered, so both predicates can be served from their own index
+    active = db.session.execute(
+        select(Post.id).where((Post.last_activity_at >= now - ACTIVE_WINDOW) | Post.hot_score.is_(None))
+    ).scalars().all()
+    for start in range(0, len(active), batch_size):
+        yield db.session.execute(columns.where(Post.id.in_(active[start:start + batch_size]))).all()
+
+
+def start_hot_refresher(app, interval):
+    """Refresh hot scores every `interval` seconds on a daemon thread in this process.
+
+    Safe to call repeatedly; only the first call starts the thread.
+    """
+    global _refresher
+    if _refresher is not None:
+        return _refresher
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    refresh_hot_scores()
+            except Exception as e:
+                print(f"⚠️ Hot score refresh failed: {e!r}")
+
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=run, name="hot-score-refresher", daemon=True)
+            _refresher.start()
+            print(f"🔥 Hot score refresher running every {interval}s")
+    return _refresher
@@ -4,10 +4,25 @@ from datetime import datetime
 from flask_login import UserMixin
 from Backend.extensions import db, bcrypt
 
-# Association table for tags
+# Association table for tags; indexed both ways for tag-filtered feeds and per-post tag lists
 post_tag = db.Table('post_tag',
     db.Column('post_id', db.Integer, db.ForeignKey('post.id')),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'))
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id')),
+    db.Index('ix_post_tag_tag_id_post_id', 'tag_id', 'post_id'),
+    db.Index('ix_post_tag_post_id_tag_id', 'post_id', 'tag_id')
+)
+
+# Normalized genre/studio links; the reverse (genre_id/studio_id, anime_id) indexes serve browse filters
+anime_genre = db.Table('anime_genre',
+    db.Column('anime_id', db.Integer, db.ForeignKey('anime.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+    db.Index('ix_anime_genre_genre_id_anime_id', 'genre_id', 'anime_id')
+)
+
+anime_studio = db.Table('anime_studio',
+    db.Column('anime_id', db.Integer, db.ForeignKey('anime.id'), primary_key=True),
+    db.Column('studio_id', db.Integer, db.ForeignKey('studio.id'), primary_key=True),
+    db.Index('ix_anime_studio_studio_id_anime_id', 'studio_id', 'anime_id')
 )
 
 class User(db.Model, UserMixin):
@@ -19,6 +34,10 @@ class User(db.Model, UserMixin):
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_admin = db.Column(db.Boolean, default=False)
+    # Unread Notification rows, kept in step by the notification flusher and mark-read endpoints
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # BroadcastNotification ids up to this one count as read
+    last_seen_broadcast_id = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     reviews = db.relationship('Review', back_populates='user', cascade='all, delete-orphan')
     posts = db.relationship('Post', back_populates='user', cascade='all, delete-orphan')
@@ -53,6 +72,33 @@ class Anime(db.Model):
     favorites = db.Column(db.Integer)
     members = db.Column(db.Integer)
     source = db.Column(db.String(100))
+    content_hash = db.Column(db.String(64))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # Composite (sort key, id) indexes back keyset pagination in browse
+    __table_args__ = (
+        db.Index('ix_anime_score_id', 'score', 'id'),
+        db.Index('ix_anime_popularity_id', 'popularity', 'id'),
+        db.Index('ix_anime_year_id', 'year', 'id'),
+    )
+
+class Genre(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    anime = db.relationship('Anime', secondary=anime_genre, backref='genre_list')
+
+class Studio(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), unique=True, nullable=False)
+    anime = db.relationship('Anime', secondary=anime_studio, backref='studio_list')
+
+class SyncCheckpoint(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    last_page = db.Column(db.Integer, default=0, nullable=False)
+    status = db.Column(db.String(20), default='idle', nullable=False)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
 
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -61,6 +107,15 @@ class Review(db.Model):
     rating = db.Column(db.Float, nullable=True)
     text = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Denormalized ReviewLike counts, maintained by Backend/reactions.py
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    dislike_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # (anime_id, sort key, id) indexes back the cursor-paginated review list
+    __table_args__ = (
+        db.Index('ix_review_anime_created_id', 'anime_id', 'created_at', 'id'),
+        db.Index('ix_review_anime_likes_id', 'anime_id', 'like_count', 'id'),
+    )
 
     user = db.relationship('User', back_populates='reviews')
     anime = db.relationship('Anime', backref='reviews')
@@ -73,6 +128,9 @@ class ReviewLike(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     is_like = db.Column(db.Boolean, nullable=False)
 
+    # One reaction per user and review; upgrade-db dedupes existing rows before creating it
+    __table_args__ = (db.Index('ux_review_like_review_user', 'review_id', 'user_id', unique=True),)
+
 class ReviewComment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     review_id = db.Column(db.Integer, db.ForeignKey('review.id'), nullable=False)
@@ -88,6 +146,22 @@ class Post(db.Model):
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Denormalized PostLike counts, maintained by Backend/reactions.py
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    dislike_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    edited_at = db.Column(db.DateTime)
+    # Last like/comment/edit; the hot score refresher only revisits recently active posts
+    last_activity_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Precomputed by Backend/hot.py; higher is hotter
+    hot_score = db.Column(db.Float)
+
+    # (sort key, id) indexes back the cursor-paginated feeds
+    __table_args__ = (
+        db.Index('ix_post_created_id', 'created_at', 'id'),
+        db.Index('ix_post_user_created_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_post_hot_score_id', 'hot_score', 'id'),
+    )
 
     user = db.relationship('User', back_populates='posts')
     comments = db.relationship('PostComment', backref='post', lazy=True)
@@ -96,11 +170,11 @@ class Post(db.Model):
 
     @property
     def dislikes(self):
-        return sum(1 for like in self.likes if not like.is_like)
+        return self.dislike_count
 
     @property
     def total_likes(self):
-        return sum(1 for like in self.likes if like.is_like)
+        return self.like_count
 
 class PostComment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -111,6 +185,22 @@ class PostComment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user = db.relationship('User')
 
+    # Reply threading. `path` is the materialized path: the zero-padded ids of
+    # every ancestor and the comment itself, so a subtree is one path range.
+    # Comments from before threading are roots with a NULL path.
+    parent_id = db.Column(db.Integer, db.ForeignKey('post_comment.id'))
+    path = db.Column(db.String)
+    depth = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reply_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # Per-post comment lists and recent-comment counts for hot ranking
+        db.Index('ix_post_comment_post_created', 'post_id', 'created_at'),
+        # Top-level comments (parent_id NULL) and direct replies, in id order
+        db.Index('ix_post_comment_post_parent_id', 'post_id', 'parent_id', 'id'),
+        db.Index('ix_post_comment_post_path', 'post_id', 'path'),
+    )
+
 
 class PostLike(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -119,11 +209,17 @@ class PostLike(db.Model):
     is_like = db.Column(db.Boolean, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='_user_post_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'post_id', name='_user_post_uc'),
+        # Per-post lookups (counter backfill, cascades) lead with post_id
+        db.Index('ix_post_like_post_id_is_like', 'post_id', 'is_like'),
+    )
 
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    # Number of posts carrying the tag, maintained by create_post/delete_post
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     posts = db.relationship('Post', secondary=post_tag, back_populates='tags')
 
 class Comment(db.Model):
@@ -142,6 +238,39 @@ class UserCollection(db.Model):
     anime_id = db.Column(db.Integer, db.ForeignKey('anime.id'), nullable=False)
     collection_name = db.Column(db.String(50), nullable=False)
 
+# Precomputed top-K item-item neighbors, written by `flask build-recommendations`
+class AnimeNeighbor(db.Model):
+    anime_id = db.Column(db.Integer, db.ForeignKey('anime.id'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('anime.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+# Community rating aggregates, kept in step with Review writes (see Backend/rating_stats.py)
+class AnimeRatingStats(db.Model):
+    anime_id = db.Column(db.Integer, db.ForeignKey('anime.id'), primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    hist_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_6 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_7 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_8 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_9 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hist_10 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_review_at = db.Column(db.DateTime)
+
+    @property
+    def average(self):
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+
+    @property
+    def histogram(self):
+        return [getattr(self, f'hist_{bucket}') for bucket in range(1, 11)]
+
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -152,6 +281,9 @@ class Message(db.Model):
     sender = db.relationship('User', foreign_keys=[sender_id])
     receiver = db.relationship('User', foreign_keys=[receiver_id])
 
+    # Per-recipient id ranges for stream replay
+    __table_args__ = (db.Index('ix_message_receiver_id', 'receiver_id', 'id'),)
+
 class Report(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     reported_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -173,8 +305,65 @@ class Notification(db.Model):
     type = db.Column(db.String(50))
     message = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
+    # Time of the latest event merged into this row
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # What the notification is about and who triggered it; aggregated rows
+    # (see Backend/notification_queue.py) keep the latest actor and a count
+    target_type = db.Column(db.String(20))
+    target_id = db.Column(db.Integer)
+    actor_id = db.Column(db.Integer)
+    actor_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __table_args__ = (
+        # Finds the unread row to merge an event into
+        db.Index('ix_notification_group', 'user_id', 'type', 'target_type', 'target_id'),
+        # Cursor-paginated inbox
+        db.Index('ix_notification_user_created_id', 'user_id', 'created_at', 'id'),
+    )
+
+class BroadcastNotification(db.Model):
+    """A site-wide notification stored once and merged into every inbox at read time (see Backend/broadcasts.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    message = db.Column(db.Text, nullable=False)
+    news_id = db.Column(db.Integer, db.ForeignKey('news.id'))
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Ids are compared with User.last_seen_broadcast_id, so SQLite must not reuse a deleted one
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class NotificationArchive(db.Model):
+    """A zlib-compressed JSON chunk of one user's old, read notifications (see Backend/retention.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    oldest_at = db.Column(db.DateTime)
+    newest_at = db.Column(db.DateTime)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_notification_archive_user_id', 'user_id', 'id'),
+        db.Index('ix_notification_archive_user_newest', 'user_id', 'newest_at'),
+    )
+
+class MessageArchive(db.Model):
+    """A compressed chunk of old messages between two users, stored once per pair (low id, high id)."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_low = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_high = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    oldest_at = db.Column(db.DateTime)
+    newest_at = db.Column(db.DateTime)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_message_archive_pair_id', 'user_low', 'user_high', 'id'),)
+
 class WarningMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -0,0 +1,243 @@
+import atexit
+import threading
+from datetime import datetime
+
+from collections import Counter
+from types import SimpleNamespace
+
+from sqlalchemy import bindparam, func, insert, select, tuple_, update
+
+from Backend.models import db, Notification, User
+from Backend.realtime import event_hub, notification_event
+
+# Aggregated types: every unread notification of one type about one target
+# is a single row whose message names the latest actor and how many others.
+TEMPLATES = {
+    "post_like": "{actors} liked your post '{subject}'",
+    "post_comment": "{actors} commented on your post '{subject}'",
+    "comment_reply": "{actors} replied to your comment on '{subject}'",
+}
+
+
+def describe_actors(name, count):
+    if count <= 1:
+        return name
+    others = count - 1
+    return f"{name} and {others} other{'s' if others > 1 else ''}"
+
+
+class NotificationQueue:
+    """Buffers notification events in memory and writes them in batches.
+
+    Events for the same (recipient, type, target) are coalesced, both within
+    a batch and into the recipient's existing unread row for that target, so
+    a post with thousands of likes produces one "X and 41 others" row per
+    author. ``start()`` runs the flusher on a daemon thread; the app calls it on
+    its first request, so serving processes buffer while CLI commands and the
+    shell, which never start it, have ``add()`` write through immediately.
+
+    Actors are de-duplicated within a batch and against the row's latest
+    actor; someone who likes, unlikes and likes again much later can be
+    counted twice. Each process has its own buffer, so two workers may
+    briefly create separate unread rows for one target.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}
+        self._sequence = 0
+        self._app = None
+        self._thread = None
+        self.max_pending = 1000
+
+    def add(self, recipient_id, type, actor_id=None, actor_name=None, target_type=None, target_id=None,
+            subject=None, message=None):
+        """Queue one event; plain notifications (no TEMPLATES entry) pass `message` and are never merged."""
+        if actor_id is not None and actor_id == recipient_id:
+            return
+        now = datetime.utcnow()
+        with self._lock:
+            if type in TEMPLATES:
+                key = (recipient_id, type, target_type, target_id)
+            else:
+                self._sequence += 1
+                key = ("plain", self._sequence)
+            event = self._pending.get(key)
+            if event is None:
+                event = self._pending[key] = {
+                    "user_id": recipient_id, "type": type, "target_type": target_type, "target_id": target_id,
+                    "subject": subject, "message": message, "actors": {}, "created_at": now,
+                }
+            if actor_id is not None:
+                # Re-inserting moves the actor to the end: the last one is the latest
+                event["actors"].pop(actor_id, None)
+                event["actors"][actor_id] = actor_name
+            event["subject"] = subject if subject is not None else event["subject"]
+            event["created_at"] = now
+            size = len(self._pending)
+        if self._app is None:
+            self.flush()
+        elif size >= self.max_pending:
+            self._wake.set()
+
+    def flush(self):
+        """Write everything queued so far; returns (rows inserted, rows updated). Needs an app context."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0, 0
+        try:
+            return self._write(pending)
+        except Exception:
+            db.session.rollback()
+            self._requeue(pending)
+            raise
+
+    def _requeue(self, pending):
+        """Put a batch that failed to write back in front of anything queued since."""
+        with self._lock:
+            for key, event in pending.items():
+                newer = self._pending.get(key)
+                if newer is not None:
+                    newer["actors"] = {**event["actors"], **newer["actors"]}
+                else:
+                    self._pending[key] = event
+
+    def _write(self, pending):
+        groups = {key: event for key, event in pending.items() if key[0] != "plain"}
+        existing = {}
+        keys = list(groups)
+        for start in range(0, len(keys), 500):
+            rows = db.session.execute(
+                select(Notification.id, Notification.user_id, Notification.type, Notification.target_type,
+                       Notification.target_id, Notification.actor_id, Notification.actor_count)
+                .where(Notification.is_read.is_(False),
+                       tuple_(Notification.user_id, Notification.type, Notification.target_type,
+                              Notification.target_id).in_(keys[start:start + 500]))
+                .order_by(Notification.id)
+            ).all()
+            # Newest unread row per group wins if a race left more than one
+            existing.update({(row.user_id, row.type, row.target_type, row.target_id): row for row in rows})
+
+        inserts, updates = [], {}
+        for key, event in pending.items():
+            row = existing.get(key)
+            if row is not None:
+                updates[row.id] = {"notification_id": row.id, **_row_values(event, row)}
+            else:
+                inserts.append(_row_values(event))
+
+        if updates:
+            table = Notification.__table__
+            db.session.execute(
+                update(table).where(table.c.id == bindparam("notification_id"), table.c.is_read.is_(False))
+                .values(actor_id=bindparam("actor_id"), actor_count=bindparam("actor_count"),
+                        message=bindparam("message"), created_at=bindparam("created_at")),
+                [{key: row[key] for key in ("notification_id", "actor_id", "actor_count", "message", "created_at")}
+                 for row in updates.values()]
+            )
+            # Rows marked read since they were looked up matched nothing (they stay locked
+            # by this transaction once updated); their events get a fresh unread row instead
+            missed = db.session.execute(
+                select(Notification.id).where(Notification.id.in_(list(updates)), Notification.is_read.is_(True))
+            ).scalars().all()
+            for notification_id in missed:
+                updates.pop(notification_id)
+            missed = set(missed)
+            inserts += [_row_values(event) for key, event in pending.items()
+                        if key in existing and existing[key].id in missed]
+        if inserts:
+            ids = db.session.scalars(
+                insert(Notification).returning(Notification.id, sort_by_parameter_order=True), inserts
+            ).all()
+            for row, notification_id in zip(inserts, ids):
+                row["id"] = notification_id
+            adjust_unread(Counter(row["user_id"] for row in inserts))
+        db.session.commit()
+
+        for row in inserts:
+            event_hub.publish(row["user_id"], "notification", row["id"], _event(row["id"], row))
+        for row in updates.values():
+            event_hub.publish(row["user_id"], "notification", row["notification_id"],
+                              _event(row["notification_id"], row), is_update=True)
+        return len(inserts), len(updates)
+
+    def _flush_in_app(self):
+        try:
+            with self._app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"⚠️ Notification flush failed, will retry: {e!r}")
+
+    def start(self, app, interval):
+        """Flush every `interval` seconds (sooner once `max_pending` events queue up) on a daemon thread.
+
+        Safe to call repeatedly; only the first call starts the thread.
+        """
+        if self._thread is not None:
+            return self._thread
+
+        def run():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                self._flush_in_app()
+
+        with self._lock:
+            if self._thread is None:
+                self._app = app
+                atexit.register(self._flush_in_app)
+                self._thread = threading.Thread(target=run, name="notification-flusher", daemon=True)
+                self._thread.start()
+        return self._thread
+
+
+notification_queue = NotificationQueue()
+
+
+def _row_values(event, row=None):
+    """Column values for an event, merged into the existing unread `row` if given."""
+    actors = event["actors"]
+    actor_id, actor_name = next(reversed(actors.items())) if actors else (None, None)
+    count = len(actors) or 1
+    if row is not None:
+        count += row.actor_count - (row.actor_id in actors)
+    message = event["message"]
+    if event["type"] in TEMPLATES:
+        message = TEMPLATES[event["type"]].format(actors=describe_actors(actor_name, count), subject=event["subject"])
+    return {"user_id": event["user_id"], "type": event["type"], "is_read": False,
+            "target_type": event["target_type"], "target_id": event["target_id"], "actor_id": actor_id,
+            "actor_count": count, "message": message, "created_at": event["created_at"]}
+
+
+def _event(notification_id, row):
+    return notification_event(SimpleNamespace(id=notification_id, is_read=False, **{
+        key: row[key] for key in ("type", "message", "target_type", "target_id", "actor_count", "created_at")
+    }))
+
+
+def adjust_unread(deltas):
+    """Move User.unread_notifications by {user_id: delta} in one executemany UPDATE."""
+    deltas = [{"user_pk": user_id, "delta": delta} for user_id, delta in deltas.items() if delta]
+    if deltas:
+        table = User.__table__
+        db.session.execute(
+            update(table).where(table.c.id == bindparam("user_pk"))
+            .values(unread_notifications=table.c.unread_notifications + bindparam("delta")),
+            deltas
+        )
+
+
+def recount_unread_notifications():
+    """Recompute User.unread_notifications from the notification table; returns users corrected."""
+    counted = (
+        select(func.count()).where(Notification.user_id == User.id, Notification.is_read.is_(False))
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        update(User).where(User.unread_notifications != counted).values(unread_notifications=counted)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
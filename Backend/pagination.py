@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import DateTime, tuple_
+
+
+class CursorError(ValueError):
+    """Raised for cursors that are malformed or were issued for a different ordering."""
+
+
+def encode_cursor(kind, *values):
+    raw = json.dumps([kind, *values], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, kind):
+    """Return the values packed into `token`, checking it was issued for `kind`."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise CursorError("Invalid cursor") from e
+    if not isinstance(data, list) or not data or data[0] != kind:
+        raise CursorError("Cursor does not match this ordering")
+    return data[1:]
+
+
+def keyset_after(column, id_column, value, last_id, descending):
+    """Rows strictly after (value, last_id) in ORDER BY (column, id), both in one direction.
+
+    Written as a row-value comparison so it maps onto a composite (column, id)
+    index range scan. Rows with a NULL sort value are handled by ``keyset_page``.
+    """
+    if column is id_column:
+        return id_column < last_id if descending else id_column > last_id
+    if descending:
+        return tuple_(column, id_column) < tuple_(value, last_id)
+    return tuple_(column, id_column) > tuple_(value, last_id)
+
+
+def keyset_order(column, id_column, descending, nulls_last=False):
+    if column is id_column:
+        return [id_column.desc() if descending else id_column.asc()]
+    ordered = column.desc() if descending else column.asc()
+    if nulls_last:
+        ordered = ordered.nullslast()
+    return [ordered, id_column.desc() if descending else id_column.asc()]
+
+
+def keyset_page(query, column, id_column, after, limit, descending=True, key=None):
+    """Fetch one keyset page of `query` ordered by (column, id).
+
+    `after` is the (value, id) pair of the last row already seen, or None for
+    the first page. Nullable sort columns put NULLs last: the non-NULL range is
+    read first and the NULL tail, ordered by id, continues when it runs out.
+    Returns the rows and the (value, id) pair to resume from, or None at the end;
+    pass `key` to read that pair off rows that are not plain entities.
+    """
+    value, last_id = after if after else (None, None)
+    if isinstance(value, str) and isinstance(column.type, DateTime):
+        # Cursors carry datetimes as text (see encode_cursor)
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError as e:
+            raise CursorError("Invalid cursor") from e
+    rows = []
+    if after is None or value is not None:
+        page = query.filter(column.isnot(None)) if column is not id_column else query
+        if after:
+            page = page.filter(keyset_after(column, id_column, value, last_id, descending))
+        rows = page.order_by(*keyset_order(column, id_column, descending)).limit(limit + 1).all()
+
+    if len(rows) <= limit and column is not id_column and column.expression.nullable:
+        tail = query.filter(column.is_(None))
+        if after and value is None:
+            tail = tail.filter(id_column < last_id if descending else id_column > last_id)
+        rows += tail.order_by(*keyset_order(id_column, id_column, descending)).limit(limit + 1 - len(rows)).all()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    if key is not None:
+        return rows, key(rows[-1])
+    return rows, (getattr(rows[-1], column.key), getattr(rows[-1], id_column.key))
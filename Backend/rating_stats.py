@@ -0,0 +1,126 @@
+from sqlalchemy import case, delete, func, select, update
+
+from Backend.db_utils import dialect_insert
+from Backend.models import db, AnimeRatingStats, Review
+
+_stats = AnimeRatingStats.__table__
+HIST_COLUMNS = [_stats.c[f"hist_{bucket}"] for bucket in range(1, 11)]
+
+
+def rating_bucket(rating):
+    """Histogram bucket (1-10) for a rating, or None for unrated reviews."""
+    if rating is None:
+        return None
+    return min(10, max(1, int(float(rating) + 0.5)))
+
+
+def _adjust(anime_id, rating, sign, reviewed_at=None):
+    """Add (sign=1) or remove (sign=-1) one review's contribution with a single atomic UPDATE."""
+    created = db.session.execute(
+        dialect_insert(_stats).values(anime_id=anime_id).on_conflict_do_nothing(index_elements=["anime_id"])
+    )
+    if created.rowcount:
+        # No row yet: the first review, or reviews written before the stats table existed.
+        # Build it from the review table, which already includes this change, instead of
+        # adjusting zeros (removing a pre-existing review would otherwise go negative)
+        _fill_from_reviews(anime_id)
+        return
+    values = {"review_count": _stats.c.review_count + sign}
+    bucket = rating_bucket(rating)
+    if bucket is not None:
+        values["rating_count"] = _stats.c.rating_count + sign
+        values["rating_sum"] = _stats.c.rating_sum + sign * float(rating)
+        values[f"hist_{bucket}"] = _stats.c[f"hist_{bucket}"] + sign
+    if sign > 0 and reviewed_at is not None:
+        values["last_review_at"] = case(
+            (_stats.c.last_review_at.is_(None), reviewed_at),
+            (_stats.c.last_review_at < reviewed_at, reviewed_at),
+            else_=_stats.c.last_review_at,
+        )
+    elif sign < 0:
+        # Run after the review row is deleted, so this sees the remaining reviews
+        values["last_review_at"] = (
+            select(func.max(Review.created_at)).where(Review.anime_id == anime_id).scalar_subquery()
+        )
+    db.session.execute(update(_stats).where(_stats.c.anime_id == anime_id).values(**values))
+
+
+def _fill_from_reviews(anime_id):
+    fresh = db.session.execute(_aggregate().where(Review.anime_id == anime_id)).first()
+    if fresh is None:
+        db.session.execute(delete(_stats).where(_stats.c.anime_id == anime_id))
+        return
+    values = dict(fresh._mapping)
+    del values["anime_id"]
+    db.session.execute(update(_stats).where(_stats.c.anime_id == anime_id).values(**values))
+
+
+def review_added(review):
+    _adjust(review.anime_id, review.rating, 1, review.created_at)
+
+
+def review_removed(review):
+    _adjust(review.anime_id, review.rating, -1)
+
+
+def rating_changed(anime_id, old_rating, new_rating):
+    if old_rating == new_rating:
+        return
+    old_bucket, new_bucket = rating_bucket(old_rating), rating_bucket(new_rating)
+    values = {
+        "rating_count": _stats.c.rating_count + (new_bucket is not None) - (old_bucket is not None),
+        "rating_sum": _stats.c.rating_sum + float(new_rating or 0) - float(old_rating or 0),
+    }
+    if old_bucket != new_bucket:
+        if old_bucket is not None:
+            values[f"hist_{old_bucket}"] = _stats.c[f"hist_{old_bucket}"] - 1
+        if new_bucket is not None:
+            values[f"hist_{new_bucket}"] = _stats.c[f"hist_{new_bucket}"] + 1
+    db.session.execute(update(_stats).where(_stats.c.anime_id == anime_id).values(**values))
+
+
+def community_ratings(anime_ids):
+    """{anime_id: AnimeRatingStats} for the given ids, in one primary-key lookup."""
+    if not anime_ids:
+        return {}
+    rows = AnimeRatingStats.query.filter(AnimeRatingStats.anime_id.in_(set(anime_ids))).all()
+    return {row.anime_id: row for row in rows}
+
+
+def _aggregate():
+    rounded = func.floor(Review.rating + 0.5)
+    bucket = case((rounded < 1, 1), (rounded > 10, 10), else_=rounded)
+    return select(
+        Review.anime_id,
+        func.count().label("review_count"),
+        func.count(Review.rating).label("rating_count"),
+        func.coalesce(func.sum(Review.rating), 0).label("rating_sum"),
+        *[func.sum(case((bucket == b, 1), else_=0)).label(f"hist_{b}") for b in range(1, 11)],
+        func.max(Review.created_at).label("last_review_at"),
+    ).group_by(Review.anime_id)
+
+
+def recompute_rating_stats(anime_ids=None):
+    """Rebuild aggregates from the review table; returns (rows written, rows that had drifted)."""
+    aggregate = _aggregate()
+    existing = select(_stats)
+    stale = delete(_stats)
+    if anime_ids is not None:
+        aggregate = aggregate.where(Review.anime_id.in_(anime_ids))
+        existing = existing.where(_stats.c.anime_id.in_(anime_ids))
+        stale = stale.where(_stats.c.anime_id.in_(anime_ids))
+
+    fresh = {row.anime_id: dict(row._mapping) for row in db.session.execute(aggregate)}
+    counters = ["review_count", "rating_count", "rating_sum", *(column.name for column in HIST_COLUMNS)]
+    current = {row.anime_id: row._mapping for row in db.session.execute(existing)}
+    drifted = sum(
+        1 for anime_id in set(fresh) | set(current)
+        if anime_id not in fresh or anime_id not in current
+        or any(abs(current[anime_id][key] - fresh[anime_id][key]) > 1e-6 for key in counters)
+    )
+
+    db.session.execute(stale)
+    if fresh:
+        db.session.execute(_stats.insert(), list(fresh.values()))
+    db.session.commit()
+    return len(fresh), drifted
@@ -0,0 +1,152 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, update
+
+from Backend.db_utils import dialect_insert
+from Backend.models import db, Post, PostLike, Review, ReviewLike
+
+
+class ReactionTarget:
+    """A likeable model: its like table, the column pointing at it, and its counter columns.
+
+    `activity_column`, if given, is stamped with the time of every reaction change.
+    """
+
+    def __init__(self, model, like_model, key, activity_column=None):
+        self.model = model
+        self.like_model = like_model
+        self.key = key
+        self.activity_column = activity_column
+
+    @property
+    def like_column(self):
+        return getattr(self.like_model, self.key)
+
+
+TARGETS = {
+    "post": ReactionTarget(Post, PostLike, "post_id", activity_column="last_activity_at"),
+    "review": ReactionTarget(Review, ReviewLike, "review_id"),
+}
+
+
+def _counter_update(target, target_id, likes, dislikes):
+    """Move the counters by (likes, dislikes) and return the new values in the same statement."""
+    model = target.model
+    values = {"like_count": model.like_count + likes, "dislike_count": model.dislike_count + dislikes}
+    if target.activity_column:
+        values[target.activity_column] = datetime.utcnow()
+    return db.session.execute(
+        update(model).where(model.id == target_id)
+        .values(values)
+        .returning(model.like_count, model.dislike_count)
+        .execution_options(synchronize_session=False)
+    ).one()
+
+
+def react(kind, target_id, user_id, is_like, toggle=True):
+    """Apply one like/dislike click and return {"likes", "dislikes", "reaction"}.
+
+    Every step is a single conditional statement against the (target, user)
+    unique key, so concurrent clicks can't create duplicates or lose counts:
+
+    1. ``toggle``: DELETE the same reaction if present (clicking twice undoes it);
+    2. UPDATE an opposite reaction in place (a switch);
+    3. INSERT ... ON CONFLICT DO NOTHING a new reaction.
+
+    If the insert loses a race to another request the steps are retried. The
+    counters move in the same transaction with an UPDATE ... RETURNING, so the
+    response carries the new counts without another read. The caller commits.
+    """
+    target = TARGETS[kind]
+    like_model, like_column = target.like_model, target.like_column
+    mine = (like_column == target_id) & (like_model.user_id == user_id)
+    sign = (1, 0) if is_like else (0, 1)
+    reaction = "like" if is_like else "dislike"
+
+    for _ in range(3):
+        if toggle:
+            removed = db.session.execute(
+                delete(like_model).where(mine, like_model.is_like == is_like)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if removed:
+                likes, dislikes = _counter_update(target, target_id, -sign[0], -sign[1])
+                return {"likes": likes, "dislikes": dislikes, "reaction": None}
+
+        switched = db.session.execute(
+            update(like_model).where(mine, like_model.is_like != is_like).values(is_like=is_like)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if switched:
+            likes, dislikes = _counter_update(target, target_id, sign[0] - sign[1], sign[1] - sign[0])
+            return {"likes": likes, "dislikes": dislikes, "reaction": reaction}
+
+        inserted = db.session.execute(
+            dialect_insert(like_model.__table__)
+            .values({target.key: target_id, "user_id": user_id, "is_like": is_like})
+            .on_conflict_do_nothing(index_elements=[target.key, "user_id"])
+        ).rowcount
+        if inserted:
+            likes, dislikes = _counter_update(target, target_id, *sign)
+            return {"likes": likes, "dislikes": dislikes, "reaction": reaction}
+
+        if not toggle:
+            # Nothing to change unless a concurrent click flipped it; check once more
+            current = db.session.execute(select(like_model.is_like).where(mine)).scalar()
+            if current == is_like:
+                return dict(counts(kind, target_id), reaction=reaction)
+
+    raise RuntimeError(f"Could not apply {reaction} on {kind} {target_id} after concurrent retries")
+
+
+def counts(kind, target_id):
+    model = TARGETS[kind].model
+    likes, dislikes = db.session.execute(
+        select(model.like_count, model.dislike_count).where(model.id == target_id)
+    ).one()
+    return {"likes": likes, "dislikes": dislikes}
+
+
+def dedupe_reactions():
+    """Drop duplicate (target, user) reaction rows, keeping the newest; returns rows removed.
+
+    Runs before the unique indexes are created by ``flask upgrade-db``.
+    """
+    removed = 0
+    for target in TARGETS.values():
+        like_model, like_column = target.like_model, target.like_column
+        keep = (
+            select(func.max(like_model.id))
+            .group_by(like_column, like_model.user_id)
+            .scalar_subquery()
+        )
+        removed += db.session.execute(
+            delete(like_model).where(like_model.id.not_in(keep))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    db.session.commit()
+    return removed
+
+
+def backfill_reaction_counts():
+    """Recompute like_count/dislike_count from the like tables; returns the number of rows updated."""
+    updated = 0
+    for target in TARGETS.values():
+        model, like_model, like_column = target.model, target.like_model, target.like_column
+
+        def counted(is_like):
+            return (
+                select(func.count())
+                .where(like_column == model.id, like_model.is_like == is_like)
+                .scalar_subquery()
+            )
+
+        likes, dislikes = counted(True), counted(False)
+        updated += db.session.execute(
+            update(model)
+            .where((model.like_count != likes) | (model.dislike_count != dislikes))
+            .values(like_count=likes, dislike_count=dislikes)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    db.session.commit()
+    return updated
@@ -0,0 +1,232 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import func, select
+
+from Backend.models import db, BroadcastNotification, Message, Notification
+
+# Events replayed from the database on reconnect before the client is told to resync
+REPLAY_LIMIT = 100
+# The poller re-reads this many ids below its last position, for rows that
+# committed after a higher id was already seen; repeats are dropped per stream
+POLL_OVERLAP = 50
+
+
+def notification_event(row):
+    return {
+        "id": row.id, "type": row.type, "message": row.message, "is_read": row.is_read,
+        "target_type": row.target_type, "target_id": row.target_id, "actor_count": row.actor_count,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+def broadcast_event(row):
+    return {
+        "id": row.id, "type": "broadcast", "message": row.message, "is_read": False,
+        "target_type": "news" if row.news_id else None, "target_id": row.news_id, "actor_count": 1,
+        "created_at": row.created_at.isoformat() if row.created_at else None, "broadcast": True,
+    }
+
+
+def message_event(row):
+    return {"id": row.id, "from": row.sender_id, "to": row.receiver_id, "text": row.text,
+            "time": row.created_at.isoformat()}
+
+
+class Subscription:
+    """One open stream: a bounded queue of (kind, row_id, data, is_update) and its resume position.
+
+    `last_ids` holds the highest notification and message id delivered; it
+    becomes the SSE event id so a reconnect can resume with Last-Event-ID.
+    """
+
+    def __init__(self, user_id, last_ids, max_queue=256):
+        self.user_id = user_id
+        self.last_ids = dict(last_ids)
+        self.queue = queue.Queue(max_queue)
+        self.overflowed = False
+        # Ids already sent, since the same row can arrive from a publish and the poller
+        self._sent = {kind: deque(maxlen=512) for kind in last_ids}
+
+    def offer(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # A stalled client; it will be told to refetch instead of holding memory
+            self.overflowed = True
+
+    def accept(self, kind, row_id, is_update):
+        """True if the event is news to this stream; advances the resume position.
+
+        Rows can commit out of id order, so an id below the position is still
+        delivered live unless it was already sent.
+        """
+        if kind not in self.last_ids:
+            # Broadcasts are only de-duplicated; they aren't part of the resume position
+            sent = self._sent.setdefault(kind, deque(maxlen=64))
+            if row_id in sent:
+                return False
+            sent.append(row_id)
+            return True
+        if not is_update:
+            if row_id in self._sent[kind]:
+                return False
+            self._sent[kind].append(row_id)
+        self.last_ids[kind] = max(self.last_ids[kind], row_id)
+        return True
+
+    @property
+    def event_id(self):
+        return f"{self.last_ids['notification']}-{self.last_ids['message']}"
+
+
+class EventHub:
+    """In-process publish/subscribe for the /stream endpoint.
+
+    Writes in this process publish directly after they commit. Rows written
+    by other worker processes are picked up by one poller per process, which
+    reads new ids across all subscribed users in a single primary-key range
+    query per table, plus one for new broadcasts, which go to every stream;
+    streams never query the database while idle. Updates to
+    merged notification rows are only pushed from the process that flushed
+    them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._poller = None
+
+    def subscribe(self, user_id, last_ids):
+        subscription = Subscription(user_id, last_ids)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, kind, row_id, data, is_update=False):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.offer((kind, row_id, data, is_update))
+
+    def publish_all(self, kind, row_id, data):
+        """Send an event to every open stream; it doesn't move their resume position.
+
+        Broadcasts aren't replayed on reconnect: the inbox merges them in at read time.
+        """
+        with self._lock:
+            subscribers = [subscription for group in self._subscribers.values() for subscription in group]
+        for subscription in subscribers:
+            subscription.offer((kind, row_id, data, False))
+
+    def start_poller(self, app, interval):
+        """Publish rows committed by other processes, checking every `interval` seconds.
+
+        Safe to call repeatedly; only the first call starts the thread.
+        """
+        if self._poller is not None:
+            return self._poller
+
+        def run():
+            last = None
+            while True:
+                with self._lock:
+                    user_ids = list(self._subscribers)
+                try:
+                    with app.app_context():
+                        if last is None:
+                            # Read here rather than before the loop, so a database that
+                            # isn't ready yet (no tables before upgrade-db) is retried
+                            last = {"notification": db.session.scalar(select(func.max(Notification.id))) or 0,
+                                    "message": db.session.scalar(select(func.max(Message.id))) or 0,
+                                    "broadcast": db.session.scalar(select(func.max(BroadcastNotification.id))) or 0}
+                        elif user_ids:
+                            self._poll(user_ids, last)
+                        db.session.remove()
+                except Exception as e:
+                    print(f"⚠️ Event poll failed: {e!r}")
+                time.sleep(interval)
+
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=run, name="event-poller", daemon=True)
+                self._poller.start()
+        return self._poller
+
+    def _poll(self, user_ids, last):
+        for kind, model, owner in (("notification", Notification, Notification.user_id),
+                                   ("message", Message, Message.receiver_id)):
+            newest = db.session.scalar(select(func.max(model.id))) or 0
+            if newest > last[kind]:
+                rows = db.session.execute(
+                    select(model).where(model.id > last[kind] - POLL_OVERLAP, model.id <= newest, owner.in_(user_ids))
+                    .order_by(model.id)
+                ).scalars()
+                for row in rows:
+                    serialize = notification_event if kind == "notification" else message_event
+                    self.publish(getattr(row, owner.key), kind, row.id, serialize(row))
+                last[kind] = newest
+        # Broadcasts go to everyone connected here, once each
+        broadcasts = db.session.execute(
+            select(BroadcastNotification).where(BroadcastNotification.id > last["broadcast"])
+            .order_by(BroadcastNotification.id)
+        ).scalars().all()
+        for broadcast in broadcasts:
+            self.publish_all("broadcast", broadcast.id, broadcast_event(broadcast))
+            last["broadcast"] = broadcast.id
+
+
+event_hub = EventHub()
+
+
+def format_event(kind, data, event_id):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def parse_event_id(value):
+    """(notification id, message id) from a Last-Event-ID, or None if absent or malformed."""
+    try:
+        notification_id, message_id = (int(part) for part in value.split("-"))
+        return notification_id, message_id
+    except (AttributeError, ValueError):
+        return None
+
+
+def replay(user_id, last_ids):
+    """Rows the user missed since `last_ids`, oldest first; None if there are too many to replay."""
+    events = []
+    for kind, model, owner, serialize in (
+        ("notification", Notification, Notification.user_id, notification_event),
+        ("message", Message, Message.receiver_id, message_event),
+    ):
+        rows = db.session.execute(
+            select(model).where(owner == user_id, model.id > last_ids[kind])
+            .order_by(model.id).limit(REPLAY_LIMIT + 1)
+        ).scalars().all()
+        if len(rows) > REPLAY_LIMIT:
+            return None
+        events += [(kind, row.id, serialize(row)) for row in rows]
+    return events
+
+
+def latest_ids(user_id):
+    return {
+        "notification": db.session.scalar(
+            select(func.max(Notification.id)).where(Notification.user_id == user_id)) or 0,
+        "message": db.session.scalar(select(func.max(Message.id)).where(Message.receiver_id == user_id)) or 0,
+    }
@@ -0,0 +1,150 @@
+import time
+
+from sqlalchemy import delete, func, select
+
+from Backend.models import db, AnimeNeighbor, Review, UserCollection
+
+try:
+    import numpy as np
+except ImportError:  # only the offline build needs NumPy; serving reads AnimeNeighbor
+    np = None
+
+try:
+    from scipy import sparse
+except ImportError:  # optional: without SciPy products come from per-user index lists
+    sparse = None
+
+# Implicit ratings (1-10 scale) for collection entries without an explicit review rating,
+# keyed on the names the frontend stores and matched case-insensitively.
+# "Plan to Watch" is left out on purpose: it says nothing about whether the user liked it.
+COLLECTION_RATINGS = {
+    "Favorites": 10.0,
+    "Completed": 8.0,
+    "Watching": 7.0,
+    "Dropped": 2.0,
+}
+
+# Collections that count as "liked" when seeding a user's recommendations
+SEED_COLLECTIONS = ("Favorites", "Completed", "Watching")
+
+
+def in_collections(names):
+    """Case-insensitive UserCollection.collection_name IN filter."""
+    return func.lower(UserCollection.collection_name).in_([name.lower() for name in names])
+
+
+def load_interactions():
+    """(user_ids, anime_ids, values) arrays; explicit review ratings win over collections."""
+    ratings = {}
+    implicit = {name.lower(): rating for name, rating in COLLECTION_RATINGS.items()}
+    for user_id, anime_id, collection in db.session.execute(
+        select(UserCollection.user_id, UserCollection.anime_id, func.lower(UserCollection.collection_name))
+        .where(in_collections(COLLECTION_RATINGS))
+    ):
+        ratings[(user_id, anime_id)] = implicit[collection]
+    for user_id, anime_id, rating in db.session.execute(
+        select(Review.user_id, Review.anime_id, Review.rating).where(Review.rating.isnot(None))
+    ):
+        ratings[(user_id, anime_id)] = float(rating)
+
+    if not ratings:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+    keys = np.array(list(ratings.keys()), dtype=np.int64)
+    return keys[:, 0], keys[:, 1], np.fromiter(ratings.values(), dtype=np.float64, count=len(ratings))
+
+
+def item_neighbors(user_ids, anime_ids, values, k=20, method="adjusted", block=512):
+    """Top-k cosine neighbors per anime as (anime_id, neighbor_id, score) triples.
+
+    `adjusted` centers every rating on its user's mean first (adjusted cosine),
+    so generous and harsh raters contribute alike. Similarities are computed
+    for `block` anime at a time (block x items), which bounds peak memory.
+    The ratings stay sparse throughout: a SciPy CSC matrix when SciPy is
+    installed, otherwise the same products summed from per-user index lists.
+    """
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    items, item_index = np.unique(anime_ids, return_inverse=True)
+    values = values.astype(np.float64)
+    if method == "adjusted":
+        means = np.bincount(user_index, weights=values) / np.bincount(user_index)
+        values = values - means[user_index]
+
+    shape = (len(users), len(items))
+    if sparse is not None:
+        matrix = sparse.csc_matrix((values, (user_index, item_index)), shape=shape)
+    else:
+        matrix = _CoRatings(user_index, item_index, values, shape)
+    norms = np.sqrt(np.bincount(item_index, weights=values ** 2, minlength=len(items)))
+    norms[norms == 0] = np.inf
+
+    triples = []
+    k = min(k, len(items) - 1)
+    if k <= 0:
+        return triples
+    for start in range(0, len(items), block):
+        stop = min(start + block, len(items))
+        sims = (matrix[:, start:stop].T @ matrix).toarray() if sparse is not None else matrix.block(start, stop)
+        sims = sims / norms[start:stop, None] / norms[None, :]
+        sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for row in range(stop - start):
+            keep = top_scores[row] > 0
+            anime_id = int(items[start + row])
+            triples.extend(zip([anime_id] * int(keep.sum()), items[top[row][keep]].tolist(),
+                               top_scores[row][keep].tolist()))
+    return triples
+
+
+class _CoRatings:
+    """Ratings kept as user-sorted and item-sorted index lists, for NumPy-only block products."""
+
+    def __init__(self, user_index, item_index, values, shape):
+        self.n_items = shape[1]
+        by_user = np.argsort(user_index, kind="stable")
+        self.user_items, self.user_values = item_index[by_user], values[by_user]
+        self.user_ptr = np.concatenate([[0], np.cumsum(np.bincount(user_index, minlength=shape[0]))])
+        by_item = np.argsort(item_index, kind="stable")
+        self.item_users, self.item_rows, self.item_values = user_index[by_item], item_index[by_item], values[by_item]
+        self.item_ptr = np.concatenate([[0], np.cumsum(np.bincount(item_index, minlength=shape[1]))])
+
+    def block(self, start, stop):
+        """Dense (stop - start) x items block of item-item dot products."""
+        lo, hi = self.item_ptr[start], self.item_ptr[stop]
+        users, rows, left = self.item_users[lo:hi], self.item_rows[lo:hi] - start, self.item_values[lo:hi]
+        # Pair every rating in the block with every rating by the same user
+        counts = self.user_ptr[users + 1] - self.user_ptr[users]
+        firsts = np.repeat(self.user_ptr[users] - (np.cumsum(counts) - counts), counts)
+        positions = firsts + np.arange(int(counts.sum()))
+        cells = np.repeat(rows, counts) * self.n_items + self.user_items[positions]
+        weights = np.repeat(left, counts) * self.user_values[positions]
+        return np.bincount(cells, weights=weights, minlength=(stop - start) * self.n_items).reshape(
+            stop - start, self.n_items)
+
+
+def build_recommendations(k=20, method="adjusted", batch_size=5000):
+    """Recompute and replace the AnimeNeighbor table."""
+    if np is None:
+        raise RuntimeError("NumPy is required to build recommendations")
+    started = time.monotonic()
+    user_ids, anime_ids, values = load_interactions()
+    print(f"📥 {len(values)} interactions from {len(np.unique(user_ids))} users "
+          f"over {len(np.unique(anime_ids))} anime")
+
+    triples = item_neighbors(user_ids, anime_ids, values, k=k, method=method)
+    rows, rank, previous = [], 0, None
+    for anime_id, neighbor_id, score in triples:
+        rank = rank + 1 if anime_id == previous else 1
+        previous = anime_id
+        rows.append({"anime_id": anime_id, "rank": rank, "neighbor_id": neighbor_id, "score": round(score, 6)})
+
+    db.session.execute(delete(AnimeNeighbor))
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(AnimeNeighbor.__table__.insert(), rows[i:i + batch_size])
+    db.session.commit()
+    print(f"✅ Stored {len(rows)} neighbors for {len({r['anime_id'] for r in rows})} anime "
+          f"in {time.monotonic() - started:.1f}s")
+    return len(rows)
@@ -0,0 +1,199 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, distinct, func, insert, select, text, tuple_
+
+from Backend.models import db, Message, MessageArchive, Notification, NotificationArchive
+
+NOTIFICATION_FIELDS = ("id", "type", "message", "is_read", "created_at", "target_type", "target_id",
+                       "actor_id", "actor_count")
+MESSAGE_FIELDS = ("id", "sender_id", "receiver_id", "text", "created_at")
+
+
+def _columns(model, fields):
+    return [getattr(model, field) for field in fields]
+
+
+def _dump(values):
+    """(compressed payload, raw JSON size) for a list of field-value lists."""
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, 9), len(raw)
+
+
+def _unpack(payload, fields):
+    rows = [dict(zip(fields, values)) for values in json.loads(zlib.decompress(payload))]
+    for row in rows:
+        if row["created_at"]:
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return rows
+
+
+class CompactionReport:
+    def __init__(self):
+        self.rows = 0
+        self.chunks = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def __str__(self):
+        return (f"{self.rows} rows moved into {self.chunks} new or topped-up chunks, "
+                f"{self.raw_bytes / 1024:.0f} KB of row data stored as {self.stored_bytes / 1024:.0f} KB")
+
+
+def _archive(model, owner_fields, groups, fields, chunk_size, report):
+    """Append each owner's rows to its archive, topping up its newest chunk first.
+
+    `groups` maps an owner key (values of `owner_fields`) to rows in id order.
+    Scheduled runs archive a little at a time; topping up keeps chunks near
+    `chunk_size` rows, which is where zlib earns its ratio.
+    """
+    owner_columns = _columns(model, owner_fields)
+    owners = list(groups)
+    open_chunks = {}
+    for start in range(0, len(owners), 500):
+        part = owners[start:start + 500]
+        owned = (owner_columns[0].in_([owner[0] for owner in part]) if len(owner_columns) == 1
+                 else tuple_(*owner_columns).in_(part))
+        newest = select(func.max(model.id)).where(owned).group_by(*owner_columns)
+        for chunk in db.session.execute(
+            select(model).where(model.id.in_(newest), model.row_count < chunk_size)
+        ).scalars():
+            open_chunks[tuple(getattr(chunk, field) for field in owner_fields)] = chunk
+
+    inserts = []
+    for owner, rows in groups.items():
+        values = [[getattr(row, field) for field in fields] for row in rows]
+        report.rows += len(rows)
+        report.raw_bytes += _dump(values)[1]
+        chunk = open_chunks.get(owner)
+        if chunk is not None:
+            room = chunk_size - chunk.row_count
+            head, head_rows = values[:room], rows[:room]
+            values, rows = values[room:], rows[room:]
+            report.stored_bytes -= len(chunk.payload)
+            chunk.payload = _dump(json.loads(zlib.decompress(chunk.payload)) + head)[0]
+            report.stored_bytes += len(chunk.payload)
+            # Rows read since the chunk was written can be older than it (they
+            # stayed unread past the cutoff), so widen its bounds both ways
+            chunk.first_id = min(chunk.first_id, head_rows[0].id)
+            chunk.last_id = max(chunk.last_id, head_rows[-1].id)
+            chunk.oldest_at = min([row.created_at for row in head_rows] + [chunk.oldest_at or datetime.max])
+            chunk.row_count += len(head)
+            chunk.newest_at = max([row.created_at for row in head_rows] + [chunk.newest_at or datetime.min])
+            report.chunks += 1
+        for start in range(0, len(values), chunk_size):
+            part, part_rows = values[start:start + chunk_size], rows[start:start + chunk_size]
+            payload = _dump(part)[0]
+            inserts.append({**dict(zip(owner_fields, owner)), "first_id": part[0][0], "last_id": part[-1][0],
+                            "row_count": len(part), "oldest_at": min(row.created_at for row in part_rows),
+                            "newest_at": max(row.created_at for row in part_rows), "payload": payload,
+                            "archived_at": datetime.utcnow()})
+            report.stored_bytes += len(payload)
+            report.chunks += 1
+    if inserts:
+        db.session.execute(insert(model), inserts)
+
+
+def compact_notifications(days, chunk_size=500, users_per_batch=200):
+    """Move read notifications older than `days` into NotificationArchive; returns a CompactionReport.
+
+    Unread notifications are never archived, so the unread counters don't move.
+    Users are processed `users_per_batch` at a time, one transaction each.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    report = CompactionReport()
+    old = (Notification.is_read.is_(True), Notification.created_at < cutoff)
+    user_ids = db.session.execute(select(distinct(Notification.user_id)).where(*old)).scalars().all()
+    for start in range(0, len(user_ids), users_per_batch):
+        groups = {}
+        for user_id in user_ids[start:start + users_per_batch]:
+            rows = db.session.execute(
+                select(*_columns(Notification, NOTIFICATION_FIELDS))
+                .where(Notification.user_id == user_id, *old).order_by(Notification.id)
+            ).all()
+            if rows:
+                groups[(user_id,)] = rows
+        _archive(NotificationArchive, ("user_id",), groups, NOTIFICATION_FIELDS, chunk_size, report)
+        ids = [row.id for rows in groups.values() for row in rows]
+        for part in range(0, len(ids), 1000):
+            db.session.execute(
+                delete(Notification).where(Notification.id.in_(ids[part:part + 1000]))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    return report
+
+
+def compact_messages(days, chunk_size=500, batch_size=5000):
+    """Move messages older than `days` into MessageArchive, chunked per conversation; returns a CompactionReport.
+
+    Walks the message table in id order, one batch per transaction.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    report = CompactionReport()
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*_columns(Message, MESSAGE_FIELDS)).where(Message.id > last_id, Message.created_at < cutoff)
+            .order_by(Message.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        conversations = {}
+        for row in rows:
+            pair = (min(row.sender_id, row.receiver_id), max(row.sender_id, row.receiver_id))
+            conversations.setdefault(pair, []).append(row)
+        _archive(MessageArchive, ("user_low", "user_high"), conversations, MESSAGE_FIELDS, chunk_size, report)
+        ids = [row.id for row in rows]
+        for part in range(0, len(ids), 1000):
+            db.session.execute(
+                delete(Message).where(Message.id.in_(ids[part:part + 1000]))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        last_id = rows[-1].id
+    return report
+
+
+def database_free_bytes():
+    """Bytes the database file could give back (SQLite free pages), or None on other backends."""
+    if db.engine.dialect.name != "sqlite":
+        return None
+    free_pages = db.session.execute(text("PRAGMA freelist_count")).scalar()
+    return free_pages * db.session.execute(text("PRAGMA page_size")).scalar()
+
+
+def archived_notifications(user_id, before=None, limit=None):
+    """The user's archived notifications, newest first by (created_at, id).
+
+    `before` is the (created_at, id) pair of the last item already read;
+    only older rows are returned, at most `limit` of them. Unread rows are
+    never archived, so archived rows interleave with live ones by created_at
+    and callers merge the two on that key. Chunks are read newest_at first
+    and only until no unread chunk can hold a row in the page.
+    """
+    query = select(NotificationArchive).where(NotificationArchive.user_id == user_id)
+    if before is not None:
+        query = query.where(NotificationArchive.oldest_at <= before[0])
+    rows = []
+    for chunk in db.session.execute(query.order_by(NotificationArchive.newest_at.desc())).scalars():
+        if limit is not None and len(rows) >= limit and chunk.newest_at < rows[limit - 1]["created_at"]:
+            break
+        rows += [row for row in _unpack(chunk.payload, NOTIFICATION_FIELDS)
+                 if before is None or (row["created_at"], row["id"]) < tuple(before)]
+        rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+        if limit is not None:
+            del rows[limit:]
+    return rows
+
+
+def archived_messages(user_a, user_b):
+    """Every archived message between two users, oldest first."""
+    low, high = min(user_a, user_b), max(user_a, user_b)
+    chunks = db.session.execute(
+        select(MessageArchive.payload)
+        .where(MessageArchive.user_low == low, MessageArchive.user_high == high)
+        .order_by(MessageArchive.id)
+    ).scalars()
+    return sorted((row for payload in chunks for row in _unpack(payload, MESSAGE_FIELDS)), key=lambda row: row["id"])
@@ -5,8 +5,9 @@ from functools import wraps
 
 from Backend.models import (
     db, User, Report, DevelopmentFeedback,
-    WarningMessage, News, AdminActionLog, Notification
+    WarningMessage, News, AdminActionLog, BroadcastNotification
 )
+from Backend.broadcasts import create_broadcast, publish_broadcast
 from Backend.routes.notifications import create_notification
 
 admin_bp = Blueprint('admin', __name__)
@@ -31,10 +32,6 @@ def log_admin_action(admin, action_type, target_username, detail):
     db.session.add(entry)
     db.session.commit()
 
-def create_notification(user_id, message):
-    note = Notification(user_id=user_id, message=message, is_read=False, created_at=datetime.utcnow())
-    db.session.add(note)
-
 @admin_bp.route('/admin/dev-feedback', methods=['GET'])
 @admin_required
 def view_dev_feedback():
@@ -60,7 +57,11 @@ def create_news():
         return jsonify({'error': 'Title and content required'}), 400
     news = News(title=title, content=content, created_by=current_user.id)
     db.session.add(news)
+    db.session.flush()
+    # One broadcast row reaches every inbox, however many users there are
+    broadcast = create_broadcast(f"📢 {title}", news_id=news.id, created_by=current_user.id)
     db.session.commit()
+    publish_broadcast(broadcast)
     log_admin_action(current_user, 'CREATE_NEWS', current_user.username, f'Title: {title}')
     return jsonify({'message': 'News posted successfully'}), 201
 
@@ -83,6 +84,7 @@ def delete_news(news_id):
     news = News.query.get(news_id)
     if not news:
         return jsonify({'error': 'News not found'}), 404
+    BroadcastNotification.query.filter_by(news_id=news_id).delete(synchronize_session=False)
     db.session.delete(news)
     db.session.commit()
     log_admin_action(current_user, 'DELETE_NEWS', current_user.username, f'Deleted ID {news_id}')
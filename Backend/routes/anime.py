@@ -1,5 +1,18 @@
+import math
 from flask import Blueprint, jsonify, request
-from Backend.models import db, Anime, Review, Post, User
+from sqlalchemy import func, select
+from flask_login import current_user, login_required
+from Backend.models import (
+    db, Anime, Review, Post, User, Genre, Studio, AnimeNeighbor, UserCollection, anime_genre, anime_studio
+)
+from Backend.recommendations import SEED_COLLECTIONS, in_collections
+from Backend.rating_stats import community_ratings
+from Backend import fulltext
+from Backend.pagination import CursorError, decode_cursor, encode_cursor, keyset_order, keyset_page
+from Backend.suggest import title_suggestions
+from Backend.facets import FACETS, facet_index
+from Backend.catalog_snapshot import catalog_snapshot
+from Backend.content_similarity import content_index
 
 anime_bp = Blueprint('anime', __name__)
 
@@ -84,39 +97,266 @@ def get_anime(id):
         'members': anime.members,
         'favorites': anime.favorites,
         'source': anime.source,
+        **_community_fields(community_ratings([anime.id]).get(anime.id)),
     })
 
-@anime_bp.route("/api/anime/browse")
-def browse_anime():
-    page = request.args.get('page', 1, type=int)
-    query = Anime.query
+def _community_fields(stats):
+    return {
+        'community_rating': stats.average if stats else None,
+        'community_reviews': stats.review_count if stats else 0,
+    }
+
+def _with_community(items):
+    """Attach community rating fields to browse items with one primary-key lookup per page."""
+    ratings = community_ratings([item["id"] for item in items])
+    return [{**item, **_community_fields(ratings.get(item["id"]))} for item in items]
+
+# sort name -> (column, descending); NULL values sort last and ties break on id
+BROWSE_SORTS = {
+    'id': (Anime.id, False),
+    'score': (Anime.score, True),
+    'popularity': (Anime.popularity, False),
+    'year': (Anime.year, True),
+}
+
+def _list_arg(name):
+    """Collect a multi-valued filter given as repeated params and/or comma-separated values."""
+    return [value.strip() for raw in request.args.getlist(name) for value in raw.split(',') if value.strip()]
+
+def _has_names(model, link_table, link_column, names, match_all):
+    """Anime.id filter on exact (case-insensitive) genre/studio names via the link table index."""
+    wanted = {name.lower() for name in names}
+    matching = (
+        select(link_table.c.anime_id)
+        .join(model, model.id == link_column)
+        .where(func.lower(model.name).in_(wanted))
+    )
+    if match_all:
+        matching = matching.group_by(link_table.c.anime_id).having(func.count() == len(wanted))
+    return Anime.id.in_(matching)
 
+def _browse_filters(query, skip=()):
+    """Apply the browse filters from the request args to `query`, except the ones named in `skip`."""
     title = request.args.get('title')
-    genre = request.args.get('genre')
+    genres = _list_arg('genre')
+    studios = _list_arg('studio')
     type_ = request.args.get('type')
     status = request.args.get('status')
+    years = [int(y) for y in _list_arg('year') if y.isdigit()]
 
-    if title:
+    if title and 'title' not in skip:
         query = query.filter(Anime.title.ilike(f"%{title}%"))
-    if genre:
-        query = query.filter(Anime.genres.ilike(f"%{genre}%"))
-    if type_:
+    if genres and 'genre' not in skip:
+        match_all = request.args.get('genre_mode', 'any') == 'all'
+        query = query.filter(_has_names(Genre, anime_genre, anime_genre.c.genre_id, genres, match_all))
+    if studios and 'studio' not in skip:
+        query = query.filter(_has_names(Studio, anime_studio, anime_studio.c.studio_id, studios, False))
+    if type_ and 'type' not in skip:
         query = query.filter(Anime.type == type_)
-    if status:
+    if status and 'status' not in skip:
         query = query.filter(Anime.status == status)
+    if years and 'year' not in skip:
+        query = query.filter(Anime.year.in_(years))
+    return query
 
+@anime_bp.route("/api/anime/browse")
+def browse_anime():
+    page = request.args.get('page', 1, type=int)
+    query = _browse_filters(Anime.query)
+
+    title = request.args.get('title')
+    genres = _list_arg('genre')
+    studios = _list_arg('studio')
+    type_ = request.args.get('type')
+    status = request.args.get('status')
+    years = [int(y) for y in _list_arg('year') if y.isdigit()]
+
+    sort = request.args.get('sort', 'id')
+    if sort not in BROWSE_SORTS:
+        return jsonify({"error": f"sort must be one of {', '.join(BROWSE_SORTS)}"}), 400
+    column, descending = BROWSE_SORTS[sort]
+
+    if catalog_snapshot.enabled and not title and not studios:
+        filters = dict(genres=genres, genre_mode=request.args.get('genre_mode', 'any'),
+                       types=[type_] if type_ else [], statuses=[status] if status else [], years=years)
+        return _browse_snapshot(page, sort, filters)
+
+    if 'cursor' in request.args:
+        return _browse_keyset(query, sort, column, descending)
+
+    query = query.order_by(*keyset_order(column, Anime.id, descending, nulls_last=True))
     pagination = query.paginate(page=page, per_page=20, error_out=False)
 
     return jsonify({
-        "anime": [{
-            "id": a.id,
-            "title": a.title,
-            "image_url": a.image_url,
-            "score": a.score,
-            "episodes": a.episodes,
-            "year": a.year
-        } for a in pagination.items],
+        "anime": _with_community([_browse_item(a) for a in pagination.items]),
         "total_pages": pagination.pages,
         "current_page": pagination.page
     })
 
+BROWSE_FIELDS = ("id", "title", "image_url", "score", "episodes", "year")
+
+def _browse_item(a):
+    return {field: getattr(a, field) for field in BROWSE_FIELDS}
+
+def _browse_snapshot(page, sort, filters):
+    """Same responses as the SQL paths, answered from the in-memory catalog snapshot."""
+    if 'cursor' in request.args:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        token = request.args.get('cursor')
+        try:
+            after = decode_cursor(token, f"browse:{sort}") if token else None
+        except CursorError as e:
+            return jsonify({"error": str(e)}), 400
+        with_total = request.args.get('with_total') == '1'
+        items, total, next_after = catalog_snapshot.browse(sort, after=after, limit=limit,
+                                                           with_total=with_total, **filters)
+        payload = {
+            "anime": _with_community([{field: item[field] for field in BROWSE_FIELDS} for item in items]),
+            "next_cursor": encode_cursor(f"browse:{sort}", *next_after) if next_after else None,
+        }
+        if with_total:
+            payload["total"] = total
+        return jsonify(payload)
+
+    page = max(page, 1)
+    items, total, _ = catalog_snapshot.browse(sort, page=page, limit=20, **filters)
+    return jsonify({
+        "anime": _with_community([{field: item[field] for field in BROWSE_FIELDS} for item in items]),
+        "total_pages": math.ceil(total / 20),
+        "current_page": page
+    })
+
+def _browse_keyset(query, sort, column, descending):
+    """Cursor mode: indexed range scans instead of OFFSET, and no COUNT unless asked for."""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    token = request.args.get('cursor')
+    try:
+        after = decode_cursor(token, f"browse:{sort}") if token else None
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows, next_after = keyset_page(query, column, Anime.id, after, limit, descending)
+    payload = {
+        "anime": _with_community([_browse_item(a) for a in rows]),
+        "next_cursor": encode_cursor(f"browse:{sort}", *next_after) if next_after else None,
+    }
+    if request.args.get('with_total') == '1':
+        payload["total"] = query.order_by(None).count()
+    return jsonify(payload)
+
+@anime_bp.route("/api/anime/search")
+def search_anime():
+    q = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    prefix = request.args.get('prefix', '1') != '0'
+
+    hits = fulltext.search(fulltext.INDEXES['anime'], q, limit=limit, offset=offset, prefix=prefix)
+    anime_by_id = {a.id: a for a in Anime.query.filter(Anime.id.in_([hit[0] for hit in hits]))} if hits else {}
+
+    return jsonify({
+        "query": q,
+        "results": [{
+            "id": anime.id,
+            "title": anime.title,
+            "image_url": anime.image_url,
+            "score": anime.score,
+            "year": anime.year,
+            "type": anime.type,
+            "rank": rank,
+            "snippet": snippet,
+        } for anime_id, rank, snippet in hits if (anime := anime_by_id.get(anime_id))]
+    })
+
+@anime_bp.route("/api/anime/suggest")
+def suggest_anime():
+    q = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 8, type=int), 1), 20)
+    return jsonify(title_suggestions.suggest(q, limit=limit))
+
+@anime_bp.route("/api/anime/facets")
+def anime_facets():
+    filters = {facet: _list_arg(facet) for facet in FACETS}
+    genre_mode = request.args.get('genre_mode', 'any')
+    within = None
+    if request.args.get('title') or _list_arg('studio'):
+        # Filters the bitsets don't cover narrow every count to the browse matches
+        within = set(db.session.execute(_browse_filters(select(Anime.id), skip=FACETS)).scalars())
+    total, counts = facet_index.counts(filters, genre_mode=genre_mode, within=within)
+
+    def ordered(facet):
+        items = [{"value": value, "count": count} for value, count in counts[facet].items() if count]
+        if facet == "year":
+            return sorted(items, key=lambda item: item["value"], reverse=True)
+        return sorted(items, key=lambda item: (-item["count"], str(item["value"])))
+
+    return jsonify({
+        "total": total,
+        "facets": {facet: ordered(facet) for facet in FACETS}
+    })
+
+def _card(anime, **extra):
+    return {
+        "id": anime.id,
+        "title": anime.title,
+        "image_url": anime.image_url,
+        "score": anime.score,
+        "year": anime.year,
+        **extra
+    }
+
+@anime_bp.route("/api/anime/<int:id>/similar")
+def similar_anime(id):
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    rows = (
+        db.session.query(Anime, AnimeNeighbor.score)
+        .join(AnimeNeighbor, AnimeNeighbor.neighbor_id == Anime.id)
+        .filter(AnimeNeighbor.anime_id == id)
+        .order_by(AnimeNeighbor.rank)
+        .limit(limit)
+        .all()
+    )
+    if not rows and content_index.enabled:
+        # Too few ratings for collaborative neighbors yet: fall back to content similarity
+        return jsonify(_content_cards(content_index.similar(id, k=limit)))
+    return jsonify([_card(anime, similarity=score) for anime, score in rows])
+
+def _content_cards(neighbors):
+    by_id = {anime.id: anime for anime in Anime.query.filter(Anime.id.in_([i for i, _ in neighbors]))}
+    return [_card(by_id[i], similarity=score) for i, score in neighbors if i in by_id]
+
+@anime_bp.route("/api/anime/<int:id>/more-like-this")
+def more_like_this(id):
+    if not content_index.enabled:
+        return jsonify({"error": "Content similarity is unavailable (NumPy is not installed)"}), 503
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    return jsonify(_content_cards(content_index.similar(id, k=limit)))
+
+@anime_bp.route("/api/recommendations")
+@login_required
+def recommendations():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    seen = select(UserCollection.anime_id).where(UserCollection.user_id == current_user.id).union(
+        select(Review.anime_id).where(Review.user_id == current_user.id)
+    )
+    seeds = select(UserCollection.anime_id).where(
+        UserCollection.user_id == current_user.id,
+        in_collections(SEED_COLLECTIONS)
+    ).union(
+        select(Review.anime_id).where(Review.user_id == current_user.id, Review.rating >= 6)
+    )
+    scored = (
+        select(AnimeNeighbor.neighbor_id, func.sum(AnimeNeighbor.score).label('strength'))
+        .where(AnimeNeighbor.anime_id.in_(seeds), AnimeNeighbor.neighbor_id.not_in(seen))
+        .group_by(AnimeNeighbor.neighbor_id)
+        .order_by(func.sum(AnimeNeighbor.score).desc())
+        .limit(limit)
+        .subquery()
+    )
+    rows = (
+        db.session.query(Anime, scored.c.strength)
+        .join(scored, scored.c.neighbor_id == Anime.id)
+        .order_by(scored.c.strength.desc())
+        .all()
+    )
+    return jsonify([_card(anime, strength=round(strength, 4)) for anime, strength in rows])
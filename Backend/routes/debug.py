@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify
 from flask_login import current_user
+from Backend.catalog_snapshot import catalog_snapshot
 
 debug_bp = Blueprint('debug', __name__)
 
@@ -9,3 +10,7 @@ def whoami():
         return jsonify({"authenticated": True, "username": current_user.username, "id": current_user.id})
     else:
         return jsonify({"authenticated": False})
+
+@debug_bp.route("/debug/catalog-snapshot")
+def catalog_snapshot_stats():
+    return jsonify(catalog_snapshot.stats())
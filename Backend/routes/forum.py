@@ -1,8 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import login_required, current_user
-from Backend.models import db, Post, PostComment, PostLike, Tag, User
+from Backend.models import db, Post, PostComment, Tag, User, post_tag
 from datetime import datetime
-from Backend.routes.notifications import notify_comment, notify_like
+from sqlalchemy import func, select, update
+from Backend.pagination import CursorError, decode_cursor, encode_cursor, keyset_order, keyset_page
+from Backend.tags import adjust_tag_counts, tag_cache, tag_filter, tag_filter_sql
+from Backend import fulltext
+from Backend.hot import hot_score
+from Backend.routes.notifications import notify_comment, notify_like, notify_reply
+from Backend.reactions import react
 
 forum_bp = Blueprint('forum', __name__, url_prefix='/api/forum')
 
@@ -14,24 +20,173 @@ VALID_GENRES = {
 @forum_bp.route('/tags', methods=['GET'])
 def get_tags():
     tags = Tag.query.order_by(Tag.name).all()
+    if request.args.get('counts') == '1':
+        return jsonify([{'name': tag.name, 'post_count': tag.post_count} for tag in tags])
     return jsonify([tag.name for tag in tags])
 
+def _tag_names():
+    return [name.strip() for raw in request.args.getlist('tag') for name in raw.split(',') if name.strip()]
+
+def _tag_criteria():
+    """Feed filter from ?tag=A&tag=B (or tag=A,B) and tag_mode=any|all."""
+    names = _tag_names()
+    if not names:
+        return []
+    return [tag_filter(Post.id, names, match_all=request.args.get('tag_mode', 'any') == 'all')]
+
+def _post_rows(*criteria, preview=None):
+    """Post columns plus author name in one query; `preview` cuts content down in SQL."""
+    content = func.substr(Post.content, 1, preview + 1) if preview else Post.content
+    return (
+        db.session.query(Post.id, Post.title, content.label('content'), Post.created_at, Post.edited_at,
+                         Post.like_count, Post.dislike_count, Post.comment_count, Post.hot_score,
+                         User.username.label('author'))
+        .join(User, User.id == Post.user_id)
+        .filter(*criteria)
+    )
+
+def _tags_for(post_ids):
+    """Tag names for a page of posts in a single query."""
+    tags = {post_id: [] for post_id in post_ids}
+    if post_ids:
+        rows = (
+            db.session.query(post_tag.c.post_id, Tag.name)
+            .join(Tag, Tag.id == post_tag.c.tag_id)
+            .filter(post_tag.c.post_id.in_(post_ids))
+            .order_by(Tag.name)
+        )
+        for post_id, name in rows:
+            tags[post_id].append(name)
+    return tags
+
+def _preview(content, preview):
+    if preview and content and len(content) > preview:
+        return content[:preview].rstrip() + '...', True
+    return content, False
+
+# sort name -> post column; both descending with ties broken on id, each backed by a (column, id) index
+FEED_SORTS = {
+    'newest': Post.created_at,
+    'hot': Post.hot_score,
+}
+
+def _post_feed(query, serialize, with_tags=False):
+    """Shared body of the post lists.
+
+    Without `cursor` the whole list comes back as before; with it (empty for the
+    first page) the response is a keyset page on (sort column, id) plus next_cursor.
+    Either way the cost is one query for the posts and, if needed, one for tags.
+    """
+    sort = request.args.get('sort', 'newest')
+    if sort not in FEED_SORTS:
+        return jsonify({"error": f"sort must be one of {', '.join(FEED_SORTS)}"}), 400
+    column = FEED_SORTS[sort]
+    preview = request.args.get('preview', type=int)
+    preview = preview if preview and preview > 0 else None
+    query = query(preview=preview)
+    paged = 'cursor' in request.args
+    if paged:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        token = request.args.get('cursor')
+        try:
+            after = decode_cursor(token, f"posts:{sort}") if token else None
+            rows, next_after = keyset_page(query, column, Post.id, after, limit, descending=True)
+        except CursorError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        rows = query.order_by(*keyset_order(column, Post.id, True, nulls_last=True)).all()
+
+    tags = _tags_for([row.id for row in rows]) if with_tags else {}
+    items = [serialize(row, *_preview(row.content, preview), tags.get(row.id, [])) for row in rows]
+    if not paged:
+        return jsonify(items)
+    return jsonify({
+        'posts': items,
+        'next_cursor': encode_cursor(f"posts:{sort}", *next_after) if next_after else None
+    })
+
 @forum_bp.route('/posts', methods=['GET'])
 def get_posts():
-    posts = Post.query.order_by(Post.created_at.desc()).all()
-    return jsonify([
-        {
+    def serialize(post, content, truncated, tags):
+        return {
             'id': post.id,
             'title': post.title,
-            'content': post.content,
-            'author': post.user.username,
+            'content': content,
+            'truncated': truncated,
+            'author': post.author,
             'created_at': post.created_at.isoformat(),
-            'edited': False,
-            'likes': sum(1 for like in post.likes if like.is_like),
-            'dislikes': sum(1 for like in post.likes if not like.is_like),
-            'tags': [tag.name for tag in post.tags]
-        } for post in posts
-    ])
+            'edited': post.edited_at is not None,
+            'edited_at': post.edited_at.isoformat() if post.edited_at else None,
+            'likes': post.like_count,
+            'dislikes': post.dislike_count,
+            'comments': post.comment_count,
+            'tags': tags
+        }
+
+    criteria = _tag_criteria()
+    return _post_feed(lambda preview: _post_rows(*criteria, preview=preview), serialize, with_tags=True)
+
+SEARCH_SCOPES = ('all', 'posts', 'comments')
+
+@forum_bp.route('/search', methods=['GET'])
+def search_forum():
+    """Ranked full-text search over post titles/bodies and comments.
+
+    A post matching in both its own text and its comments is listed once, with
+    its best hit. Tag filters apply to the post in both cases.
+    """
+    q = request.args.get('q', '').strip()
+    scope = request.args.get('scope', 'all')
+    if scope not in SEARCH_SCOPES:
+        return jsonify({"error": f"scope must be one of {', '.join(SEARCH_SCOPES)}"}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    prefix = request.args.get('prefix', '1') != '0'
+
+    names = _tag_names()
+    match_all = request.args.get('tag_mode', 'any') == 'all'
+    candidates = current_app.config.get('FORUM_SEARCH_CANDIDATES', 5000)
+    hits = {}
+    # Each side is cut at offset + limit; merged by rank, that is enough for the requested window
+    if scope in ('all', 'posts'):
+        where, params = tag_filter_sql('t.id', names, match_all) if names else (None, None)
+        for post_id, rank, snippet in fulltext.search(fulltext.INDEXES['post'], q, limit=offset + limit, prefix=prefix,
+                                                      where=where, params=params, max_candidates=candidates):
+            hits[post_id] = (rank, snippet, 'post', None)
+    if scope in ('all', 'comments'):
+        where, params = tag_filter_sql('t.post_id', names, match_all) if names else (None, None)
+        comment_hits = fulltext.search(fulltext.INDEXES['post_comment'], q, limit=offset + limit, prefix=prefix,
+                                       where=where, params=params, max_candidates=candidates)
+        post_of = dict(
+            db.session.query(PostComment.id, PostComment.post_id)
+            .filter(PostComment.id.in_([hit[0] for hit in comment_hits]))
+        ) if comment_hits else {}
+        for comment_id, rank, snippet in comment_hits:
+            post_id = post_of.get(comment_id)
+            if post_id is not None and (post_id not in hits or hits[post_id][0] < rank):
+                hits[post_id] = (rank, snippet, 'comment', comment_id)
+
+    ranked = sorted(hits.items(), key=lambda item: item[1][0], reverse=True)[offset:offset + limit]
+    post_ids = [post_id for post_id, _ in ranked]
+    posts = {row.id: row for row in _post_rows(Post.id.in_(post_ids))} if post_ids else {}
+    tags = _tags_for(post_ids)
+
+    return jsonify({
+        "query": q,
+        "results": [{
+            "id": post.id,
+            "title": post.title,
+            "author": post.author,
+            "created_at": post.created_at.isoformat(),
+            "likes": post.like_count,
+            "dislikes": post.dislike_count,
+            "tags": tags.get(post.id, []),
+            "rank": rank,
+            "snippet": snippet,
+            "matched": matched,
+            "comment_id": comment_id,
+        } for post_id, (rank, snippet, matched, comment_id) in ranked if (post := posts.get(post_id))]
+    })
 
 @forum_bp.route('/posts', methods=['POST'])
 @login_required
@@ -44,21 +199,19 @@ def create_post():
     if not tag_names or not isinstance(tag_names, list):
         return jsonify({"error": "At least one genre tag is required."}), 400
 
-    valid_tags = [tag for tag in tag_names if tag in VALID_GENRES]
+    valid_tags = {tag for tag in tag_names if tag in VALID_GENRES}
     if not valid_tags:
         return jsonify({"error": "All tags must be valid anime genres."}), 400
 
-    post = Post(title=title, content=content, user_id=current_user.id)
+    now = datetime.utcnow()
+    post = Post(title=title, content=content, user_id=current_user.id, created_at=now,
+                last_activity_at=now, hot_score=hot_score(0, 0, 0, now))
     db.session.add(post)
     db.session.flush()
 
-    for tag_name in valid_tags:
-        tag = Tag.query.filter_by(name=tag_name).first()
-        if not tag:
-            tag = Tag(name=tag_name)
-            db.session.add(tag)
-            db.session.flush()
-        post.tags.append(tag)
+    tag_ids = tag_cache.ids(valid_tags, create=True).values()
+    db.session.execute(post_tag.insert(), [{'post_id': post.id, 'tag_id': tag_id} for tag_id in tag_ids])
+    adjust_tag_counts(tag_ids, 1)
 
     db.session.commit()
     return jsonify({'message': 'Post created successfully'}), 201
@@ -71,7 +224,7 @@ def edit_post(post_id):
         return jsonify({'error': 'Unauthorized'}), 403
 
     post.content = request.json['content']
-    post.created_at = datetime.utcnow()
+    post.edited_at = post.last_activity_at = datetime.utcnow()
     db.session.commit()
     return jsonify({'message': 'Post updated'})
 
@@ -82,6 +235,8 @@ def delete_post(post_id):
     if post.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
 
+    tag_ids = db.session.execute(select(post_tag.c.tag_id).where(post_tag.c.post_id == post.id)).scalars().all()
+    adjust_tag_counts(set(tag_ids), -1)
     db.session.delete(post)
     db.session.commit()
     return jsonify({'message': 'Post deleted'})
@@ -90,57 +245,184 @@ def delete_post(post_id):
 @login_required
 def like_post(post_id):
     post = Post.query.get_or_404(post_id)
-    existing = PostLike.query.filter_by(user_id=current_user.id, post_id=post_id).first()
-
-    if existing:
-        if existing.is_like:
-            db.session.delete(existing)
-        else:
-            existing.is_like = True
-    else:
-        db.session.add(PostLike(user_id=current_user.id, post_id=post_id, is_like=True))
-
+    result = react('post', post_id, current_user.id, True)
     db.session.commit()
-    notify_like(post_id)
-    return jsonify({'message': 'Like toggled'})
+    if result['reaction'] == 'like':
+        notify_like(post)
+    return jsonify({'message': 'Like toggled', **result})
 
 @forum_bp.route('/posts/<int:post_id>/dislike', methods=['POST'])
 @login_required
 def dislike_post(post_id):
     post = Post.query.get_or_404(post_id)
-    existing = PostLike.query.filter_by(user_id=current_user.id, post_id=post_id).first()
+    result = react('post', post_id, current_user.id, False)
+    db.session.commit()
+    return jsonify({'message': 'Dislike toggled', **result})
 
-    if existing:
-        if not existing.is_like:
-            db.session.delete(existing)
-        else:
-            existing.is_like = False
-    else:
-        db.session.add(PostLike(user_id=current_user.id, post_id=post_id, is_like=False))
+PATH_SEGMENT = 10
 
-    db.session.commit()
-    return jsonify({'message': 'Dislike toggled'})
+def _segment(comment_id):
+    return f"{comment_id:0{PATH_SEGMENT}d}"
+
+def _path_of(comment):
+    # Comments from before threading have no stored path; they are all roots
+    return comment.path or _segment(comment.id)
+
+def _subtree_range(path):
+    """(low, high) bounds on `path` that hold exactly the strict descendants of `path`.
+
+    Paths are digits only, so this is collation-safe: the upper bound is the
+    next sibling's path, i.e. the last segment plus one.
+    """
+    return path, path[:-PATH_SEGMENT] + _segment(int(path[-PATH_SEGMENT:]) + 1)
+
+def _comment_rows(*criteria):
+    """Comment columns plus author name in one query."""
+    return (
+        db.session.query(PostComment.id, PostComment.parent_id, PostComment.path, PostComment.depth,
+                         PostComment.reply_count, PostComment.text, PostComment.created_at,
+                         User.username.label('author'))
+        .join(User, User.id == PostComment.user_id)
+        .filter(*criteria)
+    )
+
+def _comment_item(row, replies=None):
+    item = {
+        'id': row.id,
+        'parent_id': row.parent_id,
+        'depth': row.depth,
+        'reply_count': row.reply_count,
+        'text': row.text,
+        'author': row.author,
+        'created_at': row.created_at.isoformat()
+    }
+    if replies is not None:
+        item['replies'] = [_comment_item(reply) for reply in replies]
+        item['more_replies'] = row.reply_count > len(replies)
+    return item
+
+def _first_replies(post_id, parent_ids, per_parent):
+    """The first `per_parent` direct replies of each parent, in one windowed query."""
+    replies = {parent_id: [] for parent_id in parent_ids}
+    if not parent_ids or per_parent <= 0:
+        return replies
+    ranked = (
+        select(PostComment.id, func.row_number().over(partition_by=PostComment.parent_id,
+                                                      order_by=PostComment.id).label('rank'))
+        .where(PostComment.post_id == post_id, PostComment.parent_id.in_(parent_ids))
+        .subquery()
+    )
+    rows = _comment_rows(
+        PostComment.id.in_(select(ranked.c.id).where(ranked.c.rank <= per_parent))
+    ).order_by(PostComment.id)
+    for row in rows:
+        replies[row.parent_id].append(row)
+    return replies
+
+def _comment_page(post_id, parent_id, kind):
+    """One cursor page of `parent_id`'s direct replies (top-level comments for None).
+
+    Each comment carries its first `replies` (default 3) replies and its
+    reply_count, so deeper branches can be fetched on demand.
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    per_parent = min(max(request.args.get('replies', 3, type=int), 0), 20)
+    token = request.args.get('cursor')
+    query = _comment_rows(PostComment.post_id == post_id, PostComment.parent_id == parent_id)
+    try:
+        after = decode_cursor(token, kind) if token else None
+        rows, next_after = keyset_page(query, PostComment.id, PostComment.id, after, limit,
+                                       descending=False, key=lambda row: (row.id, row.id))
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    replies = _first_replies(post_id, [row.id for row in rows], per_parent)
+    return jsonify({
+        'comments': [_comment_item(row, replies[row.id]) for row in rows],
+        'next_cursor': encode_cursor(kind, *next_after) if next_after else None
+    })
 
 @forum_bp.route('/posts/<int:post_id>/comments', methods=['GET'])
 def get_comments(post_id):
-    comments = PostComment.query.filter_by(post_id=post_id).order_by(PostComment.created_at).all()
-    return jsonify([
-        {
-            'id': c.id,
-            'text': c.text,
-            'author': c.user.username,
-            'created_at': c.created_at.isoformat()
-        } for c in comments
-    ])
+    """All comments oldest first; with `cursor` (empty for the first page), a page of the thread tree."""
+    if 'cursor' in request.args:
+        return _comment_page(post_id, None, f"comments:{post_id}")
+    rows = _comment_rows(PostComment.post_id == post_id).order_by(PostComment.created_at)
+    return jsonify([_comment_item(row) for row in rows])
+
+@forum_bp.route('/comments/<int:comment_id>/replies', methods=['GET'])
+def get_comment_replies(comment_id):
+    comment = PostComment.query.get_or_404(comment_id)
+    return _comment_page(comment.post_id, comment.id, f"replies:{comment.id}")
+
+@forum_bp.route('/comments/<int:comment_id>/thread', methods=['GET'])
+def get_comment_thread(comment_id):
+    """The whole subtree under a comment, depth first, from one path range scan.
+
+    `max_depth` limits how many levels below the comment are returned; pages
+    are keyed on the path and continue with `cursor`.
+    """
+    comment = PostComment.query.get_or_404(comment_id)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    max_depth = request.args.get('max_depth', type=int)
+    low, high = _subtree_range(_path_of(comment))
+    criteria = [PostComment.post_id == comment.post_id, PostComment.path > low, PostComment.path < high]
+    if max_depth is not None:
+        criteria.append(PostComment.depth <= comment.depth + max(max_depth, 1))
+
+    kind = f"thread:{comment.id}"
+    token = request.args.get('cursor')
+    try:
+        after = decode_cursor(token, kind) if token else None
+        if after:
+            criteria.append(PostComment.path > str(after[0]))
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    rows = _comment_rows(*criteria).order_by(PostComment.path).limit(limit + 1).all()
+    next_cursor = encode_cursor(kind, rows[limit - 1].path) if len(rows) > limit else None
+    return jsonify({
+        'comment': _comment_item(_comment_rows(PostComment.id == comment.id).one()),
+        'replies': [_comment_item(row) for row in rows[:limit]],
+        'next_cursor': next_cursor
+    })
 
 @forum_bp.route('/posts/<int:post_id>/comments', methods=['POST'])
 @login_required
 def add_comment(post_id):
-    comment = PostComment(text=request.json['text'], post_id=post_id, user_id=current_user.id)
+    parent_id = request.json.get('parent_id')
+    parent = None
+    if parent_id is not None:
+        parent = PostComment.query.get(parent_id)
+        if not parent or parent.post_id != post_id:
+            return jsonify({'error': 'Parent comment not found on this post'}), 404
+
+    # Bump the counters and read what the notification needs in the same statement
+    post = db.session.execute(
+        update(Post).where(Post.id == post_id)
+        .values(comment_count=Post.comment_count + 1, last_activity_at=datetime.utcnow())
+        .returning(Post.id, Post.user_id, Post.title)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if not post:
+        return jsonify({'error': 'Post not found'}), 404
+
+    comment = PostComment(text=request.json['text'], post_id=post_id, user_id=current_user.id,
+                          parent_id=parent_id, depth=parent.depth + 1 if parent else 0)
     db.session.add(comment)
+    db.session.flush()
+    comment.path = (_path_of(parent) if parent else '') + _segment(comment.id)
+    if parent:
+        db.session.execute(
+            update(PostComment).where(PostComment.id == parent.id)
+            .values(reply_count=PostComment.reply_count + 1)
+            .execution_options(synchronize_session=False)
+        )
     db.session.commit()
-    notify_comment(post_id)
-    return jsonify({'username': current_user.username, 'text': comment.text})
+    notify_comment(post)
+    if parent and parent.user_id != post.user_id:
+        notify_reply(parent, post)
+    return jsonify({'id': comment.id, 'parent_id': comment.parent_id, 'depth': comment.depth,
+                    'username': current_user.username, 'text': comment.text})
 
 @forum_bp.route('/post/user/<string:username>', methods=['GET'])
 @login_required
@@ -149,17 +431,18 @@ def get_posts_by_user(username):
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    posts = Post.query.filter_by(user_id=user.id).order_by(Post.created_at.desc()).all()
-    return jsonify([
-        {
+    def serialize(p, text, truncated, tags):
+        return {
             'id': p.id,
             'title': p.title,
-            'text': p.content,
+            'text': text,
+            'truncated': truncated,
             'created_at': p.created_at.isoformat(),
-            'likes': sum(1 for like in p.likes if like.is_like),
-            'dislikes': sum(1 for like in p.likes if not like.is_like)
-        } for p in posts
-    ])
+            'likes': p.like_count,
+            'dislikes': p.dislike_count
+        }
+
+    return _post_feed(lambda preview: _post_rows(Post.user_id == user.id, preview=preview), serialize)
 
 @forum_bp.route('/user/<username>', methods=['GET'])
 def get_user_posts(username):
@@ -167,14 +450,15 @@ def get_user_posts(username):
     if not user:
         return jsonify([])
 
-    posts = Post.query.filter_by(user_id=user.id).order_by(Post.created_at.desc()).all()
-    return jsonify([
-        {
+    def serialize(p, text, truncated, tags):
+        return {
             'id': p.id,
             'title': p.title,
-            'text': p.content,
+            'text': text,
+            'truncated': truncated,
             'created_at': p.created_at,
-            'likes': sum(1 for like in p.likes if like.is_like),
-            'dislikes': sum(1 for like in p.likes if not like.is_like)
-        } for p in posts
-    ])
+            'likes': p.like_count,
+            'dislikes': p.dislike_count
+        }
+
+    return _post_feed(lambda preview: _post_rows(Post.user_id == user.id, preview=preview), serialize)
@@ -3,6 +3,9 @@ from flask_login import login_required, current_user
 from Backend.models import db, User, Friendship, FriendRequest, Message
 from datetime import datetime
 from sqlalchemy import or_, and_
+from Backend.realtime import event_hub, message_event
+from Backend.retention import archived_messages
+from types import SimpleNamespace
 
 friendship_bp = Blueprint('friendship', __name__)
 
@@ -102,6 +105,9 @@ def get_conversation(username):
             and_(Message.sender_id == friend.id, Message.receiver_id == current_user.id)
         )
     ).order_by(Message.created_at.asc()).all()
+    # Older history moved out by `flask compact` is only loaded when asked for
+    if request.args.get('include_archived') == '1':
+        messages = [SimpleNamespace(**row) for row in archived_messages(current_user.id, friend.id)] + messages
 
     return jsonify([{
         'from': msg.sender_id,
@@ -127,6 +133,7 @@ def post_message(username):
     msg = Message(sender_id=current_user.id, receiver_id=friend.id, text=data['text'], created_at=datetime.utcnow())
     db.session.add(msg)
     db.session.commit()
+    event_hub.publish(friend.id, 'message', msg.id, message_event(msg))
     return jsonify({'message': 'Sent'})
 
 # --- Search ---
@@ -1,7 +1,9 @@
+from types import SimpleNamespace
 from flask import Blueprint, jsonify
 from Backend.models import Anime, Review, Post, UserCollection, User
 from Backend.extensions import db
 from sqlalchemy import desc
+from Backend.catalog_snapshot import catalog_snapshot
 
 home_bp = Blueprint('home', __name__)
 
@@ -9,9 +11,12 @@ home_bp = Blueprint('home', __name__)
 def public_home():
     try:
         print("Fetching top anime with valid MAL scores only...")
-        top_anime = Anime.query.filter(Anime.score != None).filter(Anime.score > 0).order_by(desc(Anime.score)).limit(10).all()
-
-        most_popular = Anime.query.order_by(Anime.popularity.asc().nullslast()).limit(10).all()
+        if catalog_snapshot.enabled:
+            top_anime = [SimpleNamespace(**item) for item in catalog_snapshot.top('score', 10, minimum_score=0)]
+            most_popular = [SimpleNamespace(**item) for item in catalog_snapshot.top('popularity', 10)]
+        else:
+            top_anime = Anime.query.filter(Anime.score != None).filter(Anime.score > 0).order_by(desc(Anime.score)).limit(10).all()
+            most_popular = Anime.query.order_by(Anime.popularity.asc().nullslast()).limit(10).all()
         recent_reviews = Review.query.order_by(Review.created_at.desc()).limit(6).all()
         recent_posts = Post.query.order_by(Post.created_at.desc()).limit(6).all()
 
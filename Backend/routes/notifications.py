@@ -1,37 +1,165 @@
+from datetime import datetime
+from types import SimpleNamespace
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
-from Backend.models import Notification, db, Post, PostComment, UserCollection, Anime
+from sqlalchemy import case, update
+from Backend.models import Notification, User, db, UserCollection, Anime
+from Backend.broadcasts import broadcasts_for, mark_broadcasts_seen, unseen_broadcast_count
+from Backend.notification_queue import notification_queue
+from Backend.pagination import CursorError, decode_cursor, encode_cursor, keyset_page
+from Backend.retention import archived_notifications
 
 notifications_bp = Blueprint('notifications', __name__)
 
-# GET: Fetch all notifications for the logged-in user
+def _notification_item(n):
+    return {
+        'id': n.id,
+        'type': n.type,
+        'message': n.message,
+        'is_read': n.is_read,
+        'target_type': n.target_type,
+        'target_id': n.target_id,
+        'actor_count': n.actor_count,
+        'created_at': n.created_at
+    }
+
+# GET: Fetch notifications for the logged-in user, newest first.
+# Without `cursor` this is the full list; with it (empty for the first page) a
+# keyset page over (user_id, created_at, id) plus next_cursor. `unread=1` filters.
+# `include_archived=1` also returns notifications moved out by `flask compact`
+# (always read), merged with the live ones by (created_at, id); those items
+# carry "archived": true.
+# Site-wide broadcasts are merged in by created_at and carry "broadcast": true;
+# a cursor page holds `limit` notifications plus the broadcasts among them.
 @notifications_bp.route('/notifications', methods=['GET'])
 @login_required
 def get_notifications():
-    notes = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).all()
-    return jsonify([
-        {
-            'id': n.id,
-            'message': n.message,
-            'is_read': n.is_read,
-            'created_at': n.created_at
-        } for n in notes
-    ])
+    query = Notification.query.filter_by(user_id=current_user.id)
+    unread_only = request.args.get('unread') == '1'
+    if unread_only:
+        query = query.filter(Notification.is_read.is_(False))
+    with_archive = request.args.get('include_archived') == '1' and not unread_only
+    if 'cursor' not in request.args:
+        notes = query.order_by(Notification.created_at.desc()).all()
+        items = [_notification_item(n) for n in notes] + broadcasts_for(current_user, unseen_only=unread_only)
+        if with_archive:
+            items += [_archived_item(row) for row in archived_notifications(current_user.id)]
+        return jsonify(_newest_first(items))
+
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    token = request.args.get('cursor')
+    try:
+        after = decode_cursor(token, "notifications") if token else None
+        if after is not None and (len(after) != 2 or not isinstance(after[1], int)):
+            raise CursorError("Invalid cursor")
+        older_than = _cursor_time(after[0]) if after else None
+        notes, next_after = keyset_page(query, Notification.created_at, Notification.id, after, limit)
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    items = [_notification_item(n) for n in notes]
+    if with_archive and not (after and older_than is None):
+        # Unread rows are never archived, so old unread live rows interleave with
+        # archived ones: take the next `limit` of both by the same (created_at, id) key
+        before = (older_than, after[1]) if after else None
+        archived = archived_notifications(current_user.id, before, limit + 1)
+        items = _newest_first(items + [_archived_item(row) for row in archived])
+        if next_after or len(items) > limit:
+            items = items[:limit]
+            next_after = (items[-1]['created_at'], items[-1]['id'])
+    # Broadcasts share the page's created_at range; the last page takes all older ones
+    newer_than = items[-1]['created_at'] if next_after else None
+    items = _with_broadcasts(items, newer_than, older_than, unread_only)
+    return _inbox_page(items, encode_cursor("notifications", *next_after) if next_after else None)
+
+def _cursor_time(value):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError) as e:
+        raise CursorError("Invalid cursor") from e
+
+def _newest_first(items):
+    return sorted(items, key=lambda item: (item['created_at'] or datetime.min, item['id']), reverse=True)
+
+def _with_broadcasts(items, newer_than, older_than, unread_only):
+    """`items` plus the broadcasts with created_at in [newer_than, older_than) (None = unbounded), newest first."""
+    return _newest_first(items + broadcasts_for(current_user, newer_than, older_than, unseen_only=unread_only))
+
+def _unread_total():
+    return current_user.unread_notifications + unseen_broadcast_count(current_user)
+
+def _inbox_page(items, next_cursor):
+    return jsonify({
+        'notifications': items,
+        'unread': _unread_total(),
+        'next_cursor': next_cursor
+    })
+
+def _archived_item(row):
+    return dict(_notification_item(SimpleNamespace(**row)), archived=True)
+
+# GET: Badge count: the counter on the user row the login already loaded, plus
+# one primary-key range count of broadcasts above the user's watermark
+@notifications_bp.route('/notifications/unread-count', methods=['GET'])
+@login_required
+def get_unread_count():
+    return jsonify({'unread': _unread_total()})
+
+def _mark_read(*criteria):
+    """Mark the user's matching unread notifications read; returns (rows marked, unread left)."""
+    marked = Notification.query.filter(
+        Notification.user_id == current_user.id, Notification.is_read.is_(False), *criteria
+    ).update({"is_read": True}, synchronize_session=False)
+    # Clamped at 0 so a counter that drifted low can't show a negative badge
+    unread = db.session.execute(
+        update(User).where(User.id == current_user.id)
+        .values(unread_notifications=case((User.unread_notifications > marked, User.unread_notifications - marked),
+                                          else_=0))
+        .returning(User.unread_notifications)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    db.session.commit()
+    return marked, unread
 
 # POST: Mark all notifications as read
 @notifications_bp.route('/notifications/mark-all-read', methods=['POST'])
 @login_required
 def mark_all_as_read():
-    Notification.query.filter_by(user_id=current_user.id, is_read=False).update({"is_read": True})
-    db.session.commit()
+    mark_broadcasts_seen(current_user.id)
+    _mark_read()
     return jsonify({'message': 'All notifications marked as read'})
 
-# HELPER: Create a new notification
-def create_notification(user_id: int, message: str):
-    if user_id != current_user.id:  # Avoid notifying yourself
-        note = Notification(user_id=user_id, message=message)
-        db.session.add(note)
+# POST: Mark notifications read by id range: {"up_to_id": N} and optionally {"from_id": M};
+# {"broadcast_up_to_id": B} marks broadcasts up to B seen (either or both)
+@notifications_bp.route('/notifications/mark-read', methods=['POST'])
+@login_required
+def mark_read():
+    data = request.get_json() or {}
+    up_to_id, from_id = data.get('up_to_id'), data.get('from_id')
+    broadcast_up_to_id = data.get('broadcast_up_to_id')
+    if up_to_id is None and broadcast_up_to_id is None:
+        return jsonify({'error': 'up_to_id or broadcast_up_to_id required'}), 400
+    if any(value is not None and not isinstance(value, int) for value in (up_to_id, from_id, broadcast_up_to_id)):
+        return jsonify({'error': 'up_to_id, from_id and broadcast_up_to_id must be integers'}), 400
+    marked = 0
+    if broadcast_up_to_id is not None:
+        mark_broadcasts_seen(current_user.id, broadcast_up_to_id)
+    if up_to_id is not None:
+        criteria = [Notification.id <= up_to_id]
+        if from_id is not None:
+            criteria.append(Notification.id >= from_id)
+        marked, _ = _mark_read(*criteria)  # commits the broadcast watermark with it
+    else:
         db.session.commit()
+    db.session.refresh(current_user)
+    return jsonify({'marked': marked, 'unread': _unread_total()})
+
+# HELPER: Create a new notification (queued; written by the notification flusher)
+def create_notification(user_id: int, message: str):
+    if current_user.is_authenticated and user_id == current_user.id:  # Avoid notifying yourself
+        return
+    notification_queue.add(user_id, 'system', message=message)
 
 # ADMIN: Create a warning notification
 
@@ -39,16 +167,19 @@ def notify_admin_warning(user_id: int):
     create_notification(user_id, "⚠️ You have received an official warning from the admin team.")
 
 # TRIGGER EXAMPLES (to be used in other routes)
+# `post` is anything with id, user_id and title; callers pass what they already loaded
+
+def notify_comment(post):
+    notification_queue.add(post.user_id, 'post_comment', current_user.id, current_user.username,
+                           'post', post.id, subject=post.title)
 
-def notify_comment(post_id: int):
-    post = Post.query.get(post_id)
-    if post:
-        create_notification(post.user_id, f"{current_user.username} commented on your post '{post.title}'")
+def notify_reply(parent_comment, post):
+    notification_queue.add(parent_comment.user_id, 'comment_reply', current_user.id, current_user.username,
+                           'comment', parent_comment.id, subject=post.title)
 
-def notify_like(post_id: int):
-    post = Post.query.get(post_id)
-    if post:
-        create_notification(post.user_id, f"{current_user.username} liked your post '{post.title}'")
+def notify_like(post):
+    notification_queue.add(post.user_id, 'post_like', current_user.id, current_user.username,
+                           'post', post.id, subject=post.title)
 
 def notify_add_to_collection(user_id: int, anime_id: int, collection_name: str):
     anime = Anime.query.get(anime_id)
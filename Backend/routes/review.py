@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from Backend.models import db, Review, ReviewComment, ReviewLike, Anime, User
-from sqlalchemy import func
+from Backend.models import db, Review, ReviewComment, Anime, User, AnimeRatingStats
+from Backend.rating_stats import rating_changed, review_added, review_removed
+from Backend.pagination import CursorError, decode_cursor, encode_cursor, keyset_order, keyset_page
+from Backend.reactions import react
 from datetime import datetime
 
 review_bp = Blueprint('review', __name__, url_prefix='/api/review')
@@ -16,8 +18,8 @@ def to_dict(self):
         "text": self.text,
         "rating": self.rating,
         "created_at": self.created_at.isoformat() if self.created_at else None,
-        "likes": len([like for like in self.likes if like.is_like]),
-        "dislikes": len([like for like in self.likes if not like.is_like]),
+        "likes": self.like_count,
+        "dislikes": self.dislike_count,
     }
 
 Review.to_dict = to_dict
@@ -38,28 +40,18 @@ def get_reviews_by_username(username):
 @login_required
 def like_review(review_id):
     review = Review.query.get_or_404(review_id)
-    like = ReviewLike.query.filter_by(user_id=current_user.id, review_id=review_id).first()
-    if not like:
-        like = ReviewLike(user_id=current_user.id, review_id=review_id, is_like=True)
-        db.session.add(like)
-    else:
-        like.is_like = True
+    result = react('review', review_id, current_user.id, True, toggle=False)
     db.session.commit()
-    return jsonify({'message': 'Liked'})
+    return jsonify({'message': 'Liked', **result})
 
 
 @review_bp.route('/<int:review_id>/dislike', methods=['POST'])
 @login_required
 def dislike_review(review_id):
     review = Review.query.get_or_404(review_id)
-    like = ReviewLike.query.filter_by(user_id=current_user.id, review_id=review_id).first()
-    if not like:
-        like = ReviewLike(user_id=current_user.id, review_id=review_id, is_like=False)
-        db.session.add(like)
-    else:
-        like.is_like = False
+    result = react('review', review_id, current_user.id, False, toggle=False)
     db.session.commit()
-    return jsonify({'message': 'Disliked'})
+    return jsonify({'message': 'Disliked', **result})
 
 
 @review_bp.route('/<int:review_id>/comments', methods=['GET'])
@@ -109,12 +101,15 @@ def submit_review():
     review = Review.query.filter_by(user_id=current_user.id, anime_id=anime_id).first()
 
     if review:
+        rating_changed(anime_id, review.rating, rating)
         review.text = text
         review.rating = rating
         message = "Review updated."
     else:
         review = Review(user_id=current_user.id, anime_id=anime_id, text=text, rating=rating, created_at=datetime.utcnow())
         db.session.add(review)
+        db.session.flush()
+        review_added(review)
         message = "Review created."
 
     db.session.commit()
@@ -131,6 +126,13 @@ def edit_review(review_id):
     if review.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
 
+    if 'rating' in data:
+        rating = data.get('rating')
+        if not isinstance(rating, (int, float)) or not (1 <= rating <= 10):
+            return jsonify({'error': 'rating must be between 1 and 10'}), 400
+        rating_changed(review.anime_id, review.rating, rating)
+        review.rating = rating
+
     review.text = new_text
     db.session.commit()
     return jsonify({'message': 'Review updated'})
@@ -145,59 +147,83 @@ def delete_review(review_id):
         return jsonify({'error': 'Unauthorized'}), 403
 
     db.session.delete(review)
+    db.session.flush()
+    review_removed(review)
     db.session.commit()
     return jsonify({'message': 'Review deleted'})
 
 
+# sort name -> review column; both orders are descending with ties broken on id
+REVIEW_SORTS = {
+    'newest': Review.created_at,
+    'helpful': Review.like_count,
+}
+
+
+def _review_item(review, username):
+    return {
+        "id": review.id,
+        "rating": review.rating,
+        "text": review.text,
+        "user": username,
+        "likes": review.like_count,
+        "dislikes": review.dislike_count,
+        "created_at": review.created_at.isoformat() if review.created_at else None
+    }
+
+
 @review_bp.route('/anime/<int:anime_id>', methods=['GET'])
 def get_reviews_for_anime(anime_id):
     anime = Anime.query.get(anime_id)
     if not anime:
         return jsonify({"error": "Anime not found"}), 404
 
-    reviews = (
-        db.session.query(Review, User)
+    sort = request.args.get('sort', 'newest')
+    if sort not in REVIEW_SORTS:
+        return jsonify({"error": f"sort must be one of {', '.join(REVIEW_SORTS)}"}), 400
+    column = REVIEW_SORTS[sort]
+
+    # Author and counters come back with the rows: one query per page, however many reviews
+    query = (
+        db.session.query(Review, User.username)
         .join(User, Review.user_id == User.id)
         .filter(Review.anime_id == anime_id)
-        .order_by(Review.created_at.desc())
-        .all()
     )
+    next_cursor = None
+    if 'cursor' in request.args:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        try:
+            rows, next_after = _review_page(query, sort, column, request.args.get('cursor'), limit)
+        except CursorError as e:
+            return jsonify({"error": str(e)}), 400
+        if next_after:
+            next_cursor = encode_cursor(f"reviews:{sort}", *next_after)
+    else:
+        rows = query.order_by(*keyset_order(column, Review.id, True, nulls_last=True)).all()
 
-    review_list = [
-        {
-            "id": review.id,
-            "rating": review.rating,
-            "text": review.text,
-            "user": user.username,
-            "likes": ReviewLike.query.filter_by(review_id=review.id, is_like=True).count(),
-            "dislikes": ReviewLike.query.filter_by(review_id=review.id, is_like=False).count(),
-            "created_at": review.created_at.isoformat()
-        } for review, user in reviews
-    ]
-
-    avg_rating = (
-        db.session.query(func.avg(Review.rating))
-        .filter(Review.anime_id == anime_id)
-        .scalar()
-    )
-    avg_rating = round(avg_rating, 2) if avg_rating else None
+    review_list = [_review_item(review, username) for review, username in rows]
+
+    stats = db.session.get(AnimeRatingStats, anime_id)
 
     user_review_data = None
     if current_user.is_authenticated:
         user_review = Review.query.filter_by(user_id=current_user.id, anime_id=anime_id).first()
         if user_review:
-            user_review_data = {
-                "id": user_review.id,
-                "rating": user_review.rating,
-                "text": user_review.text,
-                "user": current_user.username,
-                "likes": ReviewLike.query.filter_by(review_id=user_review.id, is_like=True).count(),
-                "dislikes": ReviewLike.query.filter_by(review_id=user_review.id, is_like=False).count(),
-                "created_at": user_review.created_at.isoformat()
-            }
-
-    return jsonify({
-        "average_rating": avg_rating,
+            user_review_data = _review_item(user_review, current_user.username)
+
+    payload = {
+        "average_rating": stats.average if stats else None,
+        "rating_count": stats.rating_count if stats else 0,
+        "rating_histogram": stats.histogram if stats else [0] * 10,
         "reviews": review_list,
         "user_review": user_review_data
-    })
+    }
+    if 'cursor' in request.args:
+        payload["next_cursor"] = next_cursor
+    return jsonify(payload)
+
+
+def _review_page(query, sort, column, token, limit):
+    after = decode_cursor(token, f"reviews:{sort}") if token else None
+    return keyset_page(query, column, Review.id, after, limit, descending=True,
+                       key=lambda row: (getattr(row[0], column.key), row[0].id))
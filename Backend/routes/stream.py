@@ -0,0 +1,64 @@
+import queue
+import time
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from flask_login import login_required, current_user
+
+from Backend.models import db
+from Backend.realtime import event_hub, format_event, latest_ids, parse_event_id, replay
+
+stream_bp = Blueprint('stream', __name__)
+
+# GET: Server-Sent Events for the logged-in user's new notifications and messages.
+# Event ids are "<notification id>-<message id>"; browsers send the last one back
+# as Last-Event-ID when they reconnect and missed rows are replayed from the
+# database. A `resync` event means too much was missed: refetch the lists.
+@stream_bp.route('/stream', methods=['GET'])
+@login_required
+def stream():
+    user_id = current_user.id
+    resume = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    max_seconds = current_app.config['SSE_MAX_STREAM_SECONDS']
+
+    # Subscribe before reading the database so nothing committed in between is lost
+    if resume:
+        subscription = event_hub.subscribe(user_id, {'notification': resume[0], 'message': resume[1]})
+        missed = replay(user_id, subscription.last_ids)
+    else:
+        subscription = event_hub.subscribe(user_id, latest_ids(user_id))
+        missed = []
+    # Idle streams must not hold a pooled connection
+    db.session.remove()
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            if missed is None:
+                yield format_event('resync', {}, subscription.event_id)
+            else:
+                for kind, row_id, data in missed:
+                    if subscription.accept(kind, row_id, False):
+                        yield format_event(kind, data, subscription.event_id)
+
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                try:
+                    kind, row_id, data, is_update = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if subscription.accept(kind, row_id, is_update):
+                    yield format_event(kind, data, subscription.event_id)
+                if subscription.overflowed:
+                    yield format_event('resync', {}, subscription.event_id)
+                    return
+            # Ending the stream makes the browser reconnect (and resume) after `retry`,
+            # which frees the worker thread for long-lived tabs
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
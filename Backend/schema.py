@@ -0,0 +1,52 @@
+from sqlalchemy import inspect, text
+
+from Backend.extensions import db
+from Backend.fulltext import INDEXES, ensure_search_schema
+from Backend.reactions import dedupe_reactions
+
+
+def _default_sql(arg):
+    if hasattr(arg, "text"):
+        return arg.text
+    return arg if arg.lstrip("-").isdigit() else "'" + arg.replace("'", "''") + "'"
+
+
+def upgrade_schema():
+    """Bring an existing database up to the current models.
+
+    Creates missing tables, adds columns that were added to existing models and
+    creates any declared indexes (including full-text ones) that are not there
+    yet. Columns are added as
+    nullable (with their server default, if any), so this never rewrites data.
+    """
+    db.create_all()
+    engine = db.engine
+    inspector = inspect(engine)
+    added = []
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {engine.dialect.identifier_preparer.format_table(table)} " \
+                      f"ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {_default_sql(column.server_default.arg)}"
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+
+    # Unique reaction indexes can't be created over duplicate rows
+    removed = dedupe_reactions()
+    if removed:
+        print(f"🧹 Removed {removed} duplicate like/dislike rows")
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    for search_index in INDEXES.values():
+        ensure_search_schema(search_index)
+
+    return added
@@ -0,0 +1,6 @@
+from blinker import Namespace
+
+_signals = Namespace()
+
+# Sent with `anime_ids` whenever rows in the Anime table are inserted or updated in this process
+anime_catalog_changed = _signals.signal('anime-catalog-changed')
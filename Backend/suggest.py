@@ -0,0 +1,139 @@
+import bisect
+import heapq
+import re
+import unicodedata
+from itertools import groupby
+
+from sqlalchemy import select
+
+from Backend.catalog_cache import CatalogCache
+from Backend.models import db, Anime
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_title(value):
+    """Lowercase, accent-fold and collapse punctuation: 'Pokémon: XY!' -> 'pokemon xy'."""
+    folded = unicodedata.normalize("NFKD", value or "")
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(" ", folded.casefold()).strip()
+
+
+def _title_keys(title):
+    """Every word-start suffix of the normalized title, so 'titan' finds 'Attack on Titan'."""
+    normalized = normalize_title(title)
+    words = normalized.split(" ")
+    return {" ".join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class _State:
+    __slots__ = ("entries", "keys", "ids", "top")
+
+    def __init__(self, entries, keys, ids, top):
+        self.entries = entries
+        self.keys = keys
+        self.ids = ids
+        self.top = top
+
+
+class TitleSuggestIndex(CatalogCache):
+    """Sorted in-memory prefix index over anime titles for search-as-you-type.
+
+    Lookups bisect a sorted key list and never touch the database. Prefixes that
+    match many titles (up to `max_cached_prefix` characters) have their best
+    `max_limit` ids precomputed, so even one-letter queries stay sub-millisecond.
+    Results rank by members, then popularity. State is swapped atomically, so
+    readers never see a half-applied update.
+    """
+
+    max_limit = 20
+    max_cached_prefix = 6
+    wide_prefix = 128
+
+    def __init__(self):
+        super().__init__()
+        self._state = _State({}, [], [], {})
+
+    @staticmethod
+    def _entry(anime_id, title, image_url, members, popularity):
+        rank = (-(members or 0), popularity if popularity is not None else float("inf"), anime_id)
+        return {"id": anime_id, "title": title, "image_url": image_url, "rank": rank, "keys": _title_keys(title)}
+
+    def rebuild(self):
+        rows = db.session.execute(
+            select(Anime.id, Anime.title, Anime.image_url, Anime.members, Anime.popularity)
+        ).all()
+        entries = {row.id: self._entry(*row) for row in rows}
+        pairs = sorted((key, anime_id) for anime_id, entry in entries.items() for key in entry["keys"])
+        keys = [key for key, _ in pairs]
+        ids = [anime_id for _, anime_id in pairs]
+        top = {}
+        for length in range(1, self.max_cached_prefix + 1):
+            for prefix, group in groupby(range(len(keys)), key=lambda i: keys[i][:length]):
+                group = list(group)
+                if len(prefix) == length and len(group) > self.wide_prefix:
+                    top[prefix] = self._best(entries, ids[group[0]:group[-1] + 1], self.max_limit)
+        self._state = _State(entries, keys, ids, top)
+        self.size = len(entries)
+
+    def apply_changes(self, rows):
+        state = self._state
+        entries, keys, ids, top = dict(state.entries), list(state.keys), list(state.ids), dict(state.top)
+        touched = set()
+        for anime in rows:
+            old = entries.get(anime.id)
+            if old:
+                for key in old["keys"]:
+                    i = bisect.bisect_left(keys, key)
+                    while i < len(keys) and keys[i] == key:
+                        if ids[i] == anime.id:
+                            del keys[i], ids[i]
+                            break
+                        i += 1
+                    touched.add(key)
+            entry = self._entry(anime.id, anime.title, anime.image_url, anime.members, anime.popularity)
+            entries[anime.id] = entry
+            for key in entry["keys"]:
+                i = bisect.bisect_left(keys, key)
+                keys.insert(i, key)
+                ids.insert(i, anime.id)
+                touched.add(key)
+
+        for prefix in {key[:length] for key in touched for length in range(1, self.max_cached_prefix + 1)}:
+            lo, hi = self._range(keys, prefix)
+            if hi - lo > self.wide_prefix:
+                top[prefix] = self._best(entries, ids[lo:hi], self.max_limit)
+            else:
+                top.pop(prefix, None)
+        self._state = _State(entries, keys, ids, top)
+        self.size = len(entries)
+
+    @staticmethod
+    def _range(keys, prefix):
+        return bisect.bisect_left(keys, prefix), bisect.bisect_left(keys, prefix + "\uffff")
+
+    @staticmethod
+    def _best(entries, candidate_ids, limit):
+        return heapq.nsmallest(limit, set(candidate_ids), key=lambda anime_id: entries[anime_id]["rank"])
+
+    def suggest(self, query, limit=8):
+        self.ensure_fresh()
+        prefix = normalize_title(query)
+        if not prefix:
+            return []
+        limit = min(limit, self.max_limit)
+        state = self._state
+        cached = state.top.get(prefix)
+        if cached is not None:
+            best = cached[:limit]
+        else:
+            lo, hi = self._range(state.keys, prefix)
+            best = self._best(state.entries, state.ids[lo:hi], limit)
+        entries = state.entries
+        return [
+            {"id": anime_id, "title": entries[anime_id]["title"], "image_url": entries[anime_id]["image_url"]}
+            for anime_id in best if anime_id in entries
+        ]
+
+
+title_suggestions = TitleSuggestIndex()
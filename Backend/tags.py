@@ -0,0 +1,97 @@
+import threading
+
+from sqlalchemy import func, select, update
+
+from Backend.db_utils import dialect_insert
+from Backend.models import db, Tag, post_tag
+
+
+class TagCache:
+    """Process-level tag name -> id map.
+
+    Forum tags are a short, append-only list, so ids are resolved from memory
+    instead of one SELECT per tag. ``warm()`` runs at startup; names that are
+    missing (created by another process, or new) fall through to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+
+    def warm(self):
+        ids = dict(db.session.execute(select(Tag.name, Tag.id)).all())
+        with self._lock:
+            self._ids = ids
+        return len(ids)
+
+    def ids(self, names, create=False):
+        """{name: id} for the given names; unknown names are created when `create`, else left out."""
+        names = set(names)
+        ids = self._ids
+        missing = names - ids.keys()
+        if missing:
+            found = dict(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing))).all())
+            with self._lock:
+                self._ids = ids = {**self._ids, **found}
+            missing -= found.keys()
+        result = {name: ids[name] for name in names if name in ids}
+        if missing and create:
+            db.session.execute(
+                dialect_insert(Tag.__table__).on_conflict_do_nothing(index_elements=["name"]),
+                [{"name": name} for name in missing]
+            )
+            # Not cached yet: the insert only counts once the caller's transaction commits
+            result.update(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing))).all())
+        return result
+
+
+tag_cache = TagCache()
+
+
+def tag_filter(post_id_column, names, match_all=False):
+    """Filter on posts carrying any (or all) of the tag `names`, via the (tag_id, post_id) index."""
+    tag_ids = tag_cache.ids(names)
+    if not tag_ids or (match_all and len(tag_ids) < len(set(names))):
+        return post_id_column.in_([])
+    matching = select(post_tag.c.post_id).where(post_tag.c.tag_id.in_(tag_ids.values()))
+    if match_all:
+        matching = matching.group_by(post_tag.c.post_id).having(
+            func.count(func.distinct(post_tag.c.tag_id)) == len(tag_ids)
+        )
+    return post_id_column.in_(matching)
+
+
+def tag_filter_sql(post_id_sql, names, match_all=False):
+    """The same filter as ``tag_filter`` as a raw SQL predicate and its bind params."""
+    tag_ids = list(tag_cache.ids(names).values())
+    if not tag_ids or (match_all and len(tag_ids) < len(set(names))):
+        return "1 = 0", {}
+    params = {f"tag_{i}": tag_id for i, tag_id in enumerate(tag_ids)}
+    placeholders = ", ".join(f":{name}" for name in params)
+    matching = f"SELECT post_id FROM post_tag WHERE tag_id IN ({placeholders})"
+    if match_all:
+        matching += f" GROUP BY post_id HAVING COUNT(DISTINCT tag_id) = {len(tag_ids)}"
+    return f"{post_id_sql} IN ({matching})", params
+
+
+def adjust_tag_counts(tag_ids, delta):
+    if tag_ids:
+        db.session.execute(
+            update(Tag).where(Tag.id.in_(list(tag_ids))).values(post_count=Tag.post_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def recount_tags():
+    """Recompute Tag.post_count from post_tag; returns the number of tags corrected."""
+    counted = (
+        select(func.count(func.distinct(post_tag.c.post_id)))
+        .where(post_tag.c.tag_id == Tag.id)
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        update(Tag).where(Tag.post_count != counted).values(post_count=counted)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
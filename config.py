@@ -12,3 +12,26 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+
+    JIKAN_BASE_URL = os.getenv('JIKAN_BASE_URL', 'https://api.jikan.moe/v4')
+    JIKAN_CONCURRENCY = int(os.getenv('JIKAN_CONCURRENCY', 3))
+    JIKAN_RATE_LIMIT = float(os.getenv('JIKAN_RATE_LIMIT', 3))
+
+    # How often in-process catalog indexes check the Anime table for changes
+    CATALOG_REFRESH_SECONDS = int(os.getenv('CATALOG_REFRESH_SECONDS', 30))
+    # Serve browse/home from an in-process NumPy copy of the catalog (needs numpy)
+    CATALOG_SNAPSHOT = os.getenv('CATALOG_SNAPSHOT', 'False') == 'True'
+    # Forum search ranks at most this many of the newest matches per query
+    FORUM_SEARCH_CANDIDATES = int(os.getenv('FORUM_SEARCH_CANDIDATES', 5000))
+    # Refresh forum hot scores in-process every N seconds (0 = off; use `flask refresh-hot-scores` from cron)
+    HOT_REFRESH_SECONDS = int(os.getenv('HOT_REFRESH_SECONDS', 0))
+    # Buffered notifications are written in batches this often (0 = write each one immediately)
+    NOTIFICATION_FLUSH_SECONDS = float(os.getenv('NOTIFICATION_FLUSH_SECONDS', 2))
+    # /stream (Server-Sent Events): heartbeat interval, reconnect after this long, and how often
+    # each process looks for rows written by other workers (0 = single-process, no polling)
+    SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_MAX_STREAM_SECONDS = float(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
+    SSE_POLL_SECONDS = float(os.getenv('SSE_POLL_SECONDS', 2))
+    # `flask compact` archives read notifications and messages older than these
+    NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 90))
+    MESSAGE_RETENTION_DAYS = int(os.getenv('MESSAGE_RETENTION_DAYS', 365))
@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from Backend import anime_fetcher
+from Backend.anime_fetcher import ingest_pages
+
+
+class StubClient:
+    """Serves `last_page` pages of two anime each; `failures` maps page -> statuses to answer first."""
+
+    def __init__(self, last_page, failures=None):
+        self.last_page = last_page
+        self.failures = {page: list(statuses) for page, statuses in (failures or {}).items()}
+        self.requests = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def get_json(self, url):
+        page = int(url.rsplit("=", 1)[1])
+        self.requests.append(page)
+        if self.failures.get(page):
+            return self.failures[page].pop(0), "0", None
+        items = [{"mal_id": page * 10 + i, "title": f"Anime {page}-{i}"} for i in range(2)]
+        return 200, None, {
+            "data": items if page <= self.last_page else [],
+            "pagination": {"has_next_page": page < self.last_page, "last_visible_page": self.last_page},
+        }
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=10))
+
+
+def test_ingest_retries_throttled_pages_and_stops_at_last_page():
+    client = StubClient(last_page=4, failures={2: [429, 503]})
+    stored = {}
+
+    def store(page, items):
+        stored[page] = [item["mal_id"] for item in items]
+        return {"inserted": len(items), "updated": 0, "unchanged": 0}
+
+    stats = run(ingest_pages(range(1, 20), store=store, client=client, concurrency=2, rate=1000))
+
+    assert sorted(stored) == [1, 2, 3, 4]
+    assert stored[2] == [20, 21]
+    assert client.requests.count(2) == 3
+    assert stats.failed_pages == []
+    assert stats.last_page == 4
+    assert stats.counts["inserted"] == 8
+
+
+def test_ingest_gives_up_after_max_retries():
+    client = StubClient(last_page=3, failures={1: [500] * 10})
+    stats = run(ingest_pages(range(1, 4), store=lambda page, items: {}, client=client, concurrency=1,
+                             rate=1000, max_retries=2))
+
+    assert client.requests == [1, 1, 1]
+    assert stats.failed_pages == [1]
+
+
+def test_ingest_fails_instead_of_hanging_when_the_writer_dies(monkeypatch):
+    def rollback():
+        raise ConnectionError("database gone")
+
+    def store(page, items):
+        raise ValueError("bad row")
+
+    monkeypatch.setattr(anime_fetcher, "db", SimpleNamespace(session=SimpleNamespace(rollback=rollback)))
+    client = StubClient(last_page=50)
+
+    with pytest.raises(ConnectionError):
+        run(ingest_pages(range(1, 51), store=store, client=client, concurrency=3, rate=1000, queue_size=1))
@@ -0,0 +1,88 @@
+import random
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+
+from Backend.extensions import db
+from Backend.models import BroadcastNotification, Notification, User
+from Backend.retention import compact_notifications
+from Backend.routes.notifications import notifications_bp
+
+START = datetime(2024, 1, 1)
+NOTIFICATIONS = 150
+BROADCASTS = 12
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'notifications.db'}"
+    app.config["SECRET_KEY"] = "test"
+    db.init_app(app)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(notifications_bp)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def seed_inbox(app):
+    """Old unread live rows interleaved with archived read rows and broadcasts; returns the user id."""
+    rng = random.Random(7)
+    with app.app_context():
+        user = User(username="reader", password_hash="x", created_at=START)
+        db.session.add(user)
+        db.session.flush()
+        # Whole seconds with repeats, so created_at ties (which JSON keeps) are covered
+        times = sorted(START + timedelta(minutes=rng.randrange(NOTIFICATIONS)) for _ in range(NOTIFICATIONS))
+        notes = [Notification(user_id=user.id, type="system", message=f"n{i}", created_at=at,
+                              is_read=rng.random() < 0.7) for i, at in enumerate(times)]
+        db.session.add_all(notes)
+        db.session.add_all(BroadcastNotification(message=f"b{i}", created_at=at)
+                           for i, at in enumerate(rng.sample(times, BROADCASTS // 2)
+                                                  + [START + timedelta(minutes=rng.randrange(NOTIFICATIONS))
+                                                     for _ in range(BROADCASTS - BROADCASTS // 2)]))
+        db.session.commit()
+        compact_notifications(days=30, chunk_size=40)
+        # Rows read after the first pass top up the open chunk with older rows
+        unread = Notification.query.filter_by(user_id=user.id, is_read=False).all()
+        for note in unread[::2]:
+            note.is_read = True
+        db.session.commit()
+        compact_notifications(days=30, chunk_size=40)
+        return user.id
+
+
+def page_through(client, limit):
+    items, cursor = [], ""
+    while cursor is not None:
+        page = client.get(f"/notifications?include_archived=1&limit={limit}&cursor={cursor}").get_json()
+        items += page["notifications"]
+        cursor = page["next_cursor"]
+    return items
+
+
+def test_archive_paging_returns_each_item_once_in_order(app):
+    user_id = seed_inbox(app)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+
+    everything = client.get("/notifications?include_archived=1").get_json()
+    assert len(everything) == NOTIFICATIONS + BROADCASTS
+    assert any(item.get("archived") for item in everything)
+    assert any(not item.get("archived") and not item.get("broadcast") for item in everything)
+
+    for limit in (1, 7, 30, 100):
+        items = page_through(client, limit)
+        keys = [(bool(item.get("broadcast")), item["id"]) for item in items]
+        times = [parsedate_to_datetime(item["created_at"]) for item in items]
+        assert len(keys) == len(set(keys)) == NOTIFICATIONS + BROADCASTS
+        assert times == sorted(times, reverse=True)
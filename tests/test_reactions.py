@@ -0,0 +1,87 @@
+import random
+import threading
+
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+from Backend.extensions import db
+from Backend.models import Anime, Post, Review, User
+from Backend.reactions import TARGETS, react
+
+THREADS = 8
+CLICKS_PER_THREAD = 60
+USERS = 6
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'reactions.db'}"
+    # Writers queue on SQLite's lock instead of failing with "database is locked"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f"user{i}", password_hash="x") for i in range(USERS)]
+        anime = Anime(mal_id=1, title="Stress Test")
+        db.session.add_all(users + [anime])
+        db.session.flush()
+        db.session.add(Review(user_id=users[0].id, anime_id=anime.id, rating=8, text="Review"))
+        db.session.add(Post(user_id=users[0].id, title="Post", content="Post"))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def click_in_parallel(app, kind, target_id, toggle):
+    with app.app_context():
+        user_ids = db.session.execute(select(User.id)).scalars().all()
+    start = threading.Barrier(THREADS)
+    errors = []
+
+    def clicker(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            start.wait()
+            for _ in range(CLICKS_PER_THREAD):
+                try:
+                    react(kind, target_id, rng.choice(user_ids), rng.random() < 0.6, toggle=toggle)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+            db.session.remove()
+
+    threads = [threading.Thread(target=clicker, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+@pytest.mark.parametrize("kind, toggle", [("review", True), ("review", False), ("post", True)])
+def test_parallel_reactions_keep_counters_in_step(app, kind, toggle):
+    target = TARGETS[kind]
+    with app.app_context():
+        target_id = db.session.execute(select(target.model.id)).scalar_one()
+
+    assert click_in_parallel(app, kind, target_id, toggle) == []
+
+    with app.app_context():
+        like_model, like_column = target.like_model, target.like_column
+        rows = db.session.execute(
+            select(like_model.user_id, like_model.is_like).where(like_column == target_id)
+        ).all()
+        likes, dislikes = db.session.execute(
+            select(target.model.like_count, target.model.dislike_count).where(target.model.id == target_id)
+        ).one()
+
+        assert len({user_id for user_id, _ in rows}) == len(rows)
+        assert likes == sum(1 for _, is_like in rows if is_like)
+        assert dislikes == sum(1 for _, is_like in rows if not is_like)
+        assert likes + dislikes <= USERS
+